@@ -1,6 +1,14 @@
+import os
+
 from celery import Celery
 from backend.core.config import settings
 
+# Pool children are never recycled by default: embedding models are cached per
+# process and reloading them is slow. Set a task limit only to cap memory
+# growth from a leaking dependency.
+# Override with env var: CELERY_MAX_TASKS_PER_CHILD=<n>
+MAX_TASKS_PER_CHILD = int(os.getenv("CELERY_MAX_TASKS_PER_CHILD") or 0) or None
+
 celery_app = Celery(
     "rag_tasks",
     broker=settings.REDIS_URL,
@@ -15,4 +23,5 @@ celery_app.conf.update(
     timezone="UTC",
     enable_utc=True,
     task_track_started=True,
+    worker_max_tasks_per_child=MAX_TASKS_PER_CHILD,
 )
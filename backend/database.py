@@ -1,12 +1,28 @@
+import orjson
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from backend.core.config import settings
 
 # Helper for psycopg2 to understand vector type if needed,
 # but pgvector-python usually handles it via UserDefinedType or automatically with sqlalchemy-pgvector
-# For now, standard create_engine.
 
-engine = create_engine(settings.DATABASE_URL)
+
+def _json_serializer(value) -> str:
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+# orjson handles JSONB (de)serialization; SQLAlchemy registers the loader with
+# psycopg2 so rows are parsed once at the driver level.
+# values_plus_batch also pages UPDATE/DELETE executemany through
+# psycopg2's execute_batch; INSERTs use multi-row VALUES pages.
+engine = create_engine(
+    settings.DATABASE_URL,
+    json_serializer=_json_serializer,
+    json_deserializer=orjson.loads,
+    executemany_mode="values_plus_batch",
+    executemany_batch_page_size=500,
+    insertmanyvalues_page_size=1000,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
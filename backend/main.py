@@ -9,6 +9,7 @@ from backend.database import get_db, engine, Base
 from backend.models import (
     Workspace,
     Document,
+    DocumentChunk,
     Message,
     GeneratedLesson,
     GeneratedFlashcard,
@@ -16,7 +17,7 @@ from backend.models import (
     GeneratedMindMap,
     GeneratedPodcast,
 )
-from sqlalchemy import select, desc, func
+from sqlalchemy import select, desc, func, text
 from fastapi import BackgroundTasks
 from backend.services.ingestion import ingest_file
 from backend.services.rag import chat_with_docs
@@ -25,6 +26,7 @@ from backend.services.generator import (
     generate_flashcards,
     generate_quiz,
     generate_mind_map,
+    generate_study_pack,
 )
 from backend.services.narration import generate_speech
 from backend.services.narration import get_kokoro
@@ -38,6 +40,7 @@ from backend.schemas import (
     FlashcardSet,
     Quiz,
     MindMap,
+    StudyPack,
     Podcast,
     WorkspaceCreate,
     WorkspaceOut,
@@ -47,6 +50,7 @@ from backend.schemas import (
     GenerateRequest,
 )
 from backend.services.settings import get_app_settings, update_app_settings
+from backend.services.embeddings import clear_embeddings_cache
 from pydantic import BaseModel
 import os
 import uuid
@@ -58,6 +62,28 @@ logger = logging.getLogger(__name__)
 
 Base.metadata.create_all(bind=engine)
 
+# create_all skips tables that already exist, so existing databases may lack
+# the vector search indexes (every query is then a sequential scan). Building
+# them here would lock the table during startup; the migration builds them
+# concurrently, so only point at it.
+with engine.connect() as _conn:
+    _existing_indexes = set(
+        _conn.execute(
+            text("SELECT indexname FROM pg_indexes WHERE tablename = :table"),
+            {"table": DocumentChunk.__tablename__},
+        ).scalars()
+    )
+_missing_indexes = sorted(
+    str(index.name)
+    for index in Base.metadata.tables[DocumentChunk.__tablename__].indexes
+    if index.name not in _existing_indexes
+)
+if _missing_indexes:
+    logger.warning(
+        f"Missing indexes on {DocumentChunk.__tablename__}: "
+        f"{', '.join(_missing_indexes)}; run `python -m backend.migrate_db`"
+    )
+
 
 app = FastAPI(title=settings.PROJECT_NAME, version=settings.PROJECT_VERSION)
 
@@ -159,6 +185,8 @@ def get_settings_runtime():
 
 @app.post("/settings", response_model=AppSettings)
 def save_settings(request: AppSettingsUpdate, db: Session = Depends(get_db)):
+    # Cached embedding models may be built from the old provider/model/key
+    clear_embeddings_cache()
     return update_app_settings(
         db,
         llm_provider=request.llm_provider,
@@ -197,7 +225,7 @@ async def download_model(request: DownloadRequest):
             stream_ollama_download(request.model_name, request.ollama_base_url),
             media_type="text/event-stream",
         )
-    elif request.provider == "huggingface":
+    elif request.provider in ("huggingface", "huggingface_onnx"):
         return StreamingResponse(
             stream_hf_download(request.model_name), media_type="text/event-stream"
         )
@@ -391,7 +419,7 @@ async def upload_document(
         raise HTTPException(
             status_code=400, detail=f"Unsupported LLM provider: {llm_p}"
         )
-    if emb_p not in ("openai", "huggingface"):
+    if emb_p not in ("openai", "huggingface", "huggingface_onnx"):
         raise HTTPException(
             status_code=400, detail=f"Unsupported embedding provider: {emb_p}"
         )
@@ -550,7 +578,7 @@ def get_chat_history(workspace_id: int, db: Session = Depends(get_db)):
     stmt = (
         select(Message)
         .filter(Message.workspace_id == workspace_id)
-        .order_by(Message.created_at)
+        .order_by(Message.created_at, Message.id)
     )
     messages = db.scalars(stmt).all()
     return messages
@@ -766,6 +794,95 @@ def api_generate_mindmap(request: GenerateRequest, db: Session = Depends(get_db)
     return mind_map
 
 
+@app.post("/generate/study-pack", response_model=StudyPack)
+def api_generate_study_pack(request: GenerateRequest, db: Session = Depends(get_db)):
+    """
+    Lesson, flashcards, quiz and mind map for one topic in a single LLM call.
+    Each artifact is saved like its standalone endpoint would save it.
+    """
+    try:
+        validate_workspace_content(request.workspace_id, db)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def existing(model):
+        stmt = select(model).filter(
+            model.workspace_id == request.workspace_id,
+            model.topic == request.topic,
+        )
+        return db.scalars(stmt).first()
+
+    lesson = existing(GeneratedLesson)
+    cards = existing(GeneratedFlashcard)
+    quiz = existing(GeneratedQuiz)
+    mind_map = existing(GeneratedMindMap)
+    if lesson and cards and quiz and mind_map:
+        return StudyPack(
+            lesson=lesson.content,
+            flashcards=cards.flashcards,
+            quiz=quiz.quiz_content,
+            mind_map=mind_map.mindmap_content,
+        )
+
+    # Generate
+    try:
+        pack = generate_study_pack(request.topic, request.workspace_id, db)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("Study pack generation failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # Save (previously generated artifacts are kept and returned as-is)
+    if lesson:
+        pack.lesson = LessonPlan.model_validate(lesson.content)
+    else:
+        db.add(
+            GeneratedLesson(
+                workspace_id=request.workspace_id,
+                topic=request.topic,
+                content=pack.lesson.model_dump(),
+            )
+        )
+    if cards:
+        pack.flashcards = FlashcardSet.model_validate(cards.flashcards)
+    else:
+        db.add(
+            GeneratedFlashcard(
+                workspace_id=request.workspace_id,
+                topic=request.topic,
+                flashcards=pack.flashcards.model_dump(),
+            )
+        )
+    if quiz:
+        pack.quiz = Quiz.model_validate(quiz.quiz_content)
+    else:
+        db.add(
+            GeneratedQuiz(
+                workspace_id=request.workspace_id,
+                topic=request.topic,
+                quiz_content=pack.quiz.model_dump(),
+            )
+        )
+    if mind_map:
+        pack.mind_map = MindMap.model_validate(mind_map.mindmap_content)
+    else:
+        db.add(
+            GeneratedMindMap(
+                workspace_id=request.workspace_id,
+                topic=request.topic,
+                mindmap_content=pack.mind_map.model_dump(),
+            )
+        )
+    db.commit()
+
+    return pack
+
+
 @app.post("/generate/podcast", response_model=Podcast)
 def api_generate_podcast(
     request: GeneratePodcastRequest,
@@ -0,0 +1,323 @@
+import os
+
+from backend.database import engine
+from sqlalchemy import text
+
+from backend.models import EMBEDDING_DIMS
+
+
+def _has_column(conn, table: str, column: str) -> bool:
+    return (
+        conn.execute(
+            text(
+                "SELECT 1 FROM information_schema.columns "
+                "WHERE table_name = :table AND column_name = :column"
+            ),
+            {"table": table, "column": column},
+        ).first()
+        is not None
+    )
+
+
+def _has_constraint(conn, name: str) -> bool:
+    return (
+        conn.execute(
+            text("SELECT 1 FROM pg_constraint WHERE conname = :name"),
+            {"name": name},
+        ).first()
+        is not None
+    )
+
+
+def normalize_embeddings(conn):
+    # Inner-product search assumes unit-length vectors (pgvector >= 0.7)
+    for dim in EMBEDDING_DIMS:
+        if not _has_column(conn, "document_chunks", f"embedding_{dim}"):
+            continue
+        conn.execute(
+            text(
+                f"UPDATE document_chunks SET embedding_{dim} = l2_normalize(embedding_{dim}) "
+                f"WHERE embedding_{dim} IS NOT NULL "
+                f"AND abs(vector_norm(embedding_{dim}) - 1.0) >= 1e-3"
+            )
+        )
+        conn.execute(
+            text(
+                f"""
+                DO $$ BEGIN
+                    ALTER TABLE document_chunks
+                        ADD CONSTRAINT ck_document_chunks_embedding_{dim}_unit_norm
+                        CHECK (abs(vector_norm(embedding_{dim}) - 1.0) < 1e-3);
+                EXCEPTION WHEN duplicate_object THEN NULL;
+                END $$
+                """
+            )
+        )
+
+
+def halfvec_indexes(conn):
+    # Full-precision HNSW indexes on the legacy columns are dropped; the halfvec
+    # indexes on the single embedding column are built by tune_hnsw_indexes
+    for dim in EMBEDDING_DIMS:
+        if not _has_column(conn, "document_chunks", f"embedding_{dim}"):
+            continue
+        conn.execute(
+            text(f"DROP INDEX IF EXISTS ix_document_chunks_embedding_{dim}_hnsw")
+        )
+
+
+def single_embedding_column(conn):
+    # Collapse embedding_{dim} columns into one vector column tagged with its dimension
+    legacy = [
+        f"embedding_{dim}"
+        for dim in EMBEDDING_DIMS
+        if _has_column(conn, "document_chunks", f"embedding_{dim}")
+    ]
+    if legacy:
+        conn.execute(
+            text(
+                "ALTER TABLE document_chunks "
+                "ADD COLUMN IF NOT EXISTS embedding vector, "
+                "ADD COLUMN IF NOT EXISTS embedding_dim SMALLINT"
+            )
+        )
+        conn.execute(
+            text(
+                f"UPDATE document_chunks SET embedding = COALESCE({', '.join(legacy)}) "
+                "WHERE embedding IS NULL"
+            )
+        )
+        conn.execute(
+            text(
+                "UPDATE document_chunks SET embedding_dim = vector_dims(embedding) "
+                "WHERE embedding IS NOT NULL AND embedding_dim IS NULL"
+            )
+        )
+        # Rows that were never embedded cannot be searched anyway
+        conn.execute(text("DELETE FROM document_chunks WHERE embedding IS NULL"))
+        conn.execute(
+            text(
+                "ALTER TABLE document_chunks "
+                "ALTER COLUMN embedding SET NOT NULL, "
+                "ALTER COLUMN embedding_dim SET NOT NULL"
+            )
+        )
+        for column in legacy:
+            # Dependent indexes and check constraints are dropped with the column
+            conn.execute(text(f"ALTER TABLE document_chunks DROP COLUMN {column}"))
+
+    for name, check in (
+        (
+            "ck_document_chunks_embedding_unit_norm",
+            "abs(vector_norm(embedding) - 1.0) < 1e-3",
+        ),
+        ("ck_document_chunks_embedding_dim", "vector_dims(embedding) = embedding_dim"),
+    ):
+        # Checked up front: Postgres resolves the CHECK expression before the
+        # name, and vector_norm() does not exist for the later halfvec column
+        if _has_constraint(conn, name):
+            continue
+        conn.execute(
+            text(f"ALTER TABLE document_chunks ADD CONSTRAINT {name} CHECK ({check})")
+        )
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_document_chunks_embedding_dim "
+            "ON document_chunks (embedding_dim)"
+        )
+    )
+
+
+def halfvec_embedding_column(conn):
+    # Store embeddings as FP16, the precision the HNSW indexes use. Runs before
+    # any HNSW build: changing the column type would rebuild every index on it
+    # inside this transaction, so they are dropped here and rebuilt
+    # CONCURRENTLY by tune_hnsw_indexes.
+    data_type = conn.execute(
+        text(
+            "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+            "WHERE attrelid = 'document_chunks'::regclass AND attname = 'embedding'"
+        )
+    ).scalar()
+    if data_type != "vector":
+        return
+    conn.execute(
+        text(
+            "ALTER TABLE document_chunks "
+            "DROP CONSTRAINT IF EXISTS ck_document_chunks_embedding_unit_norm"
+        )
+    )
+    for dim in EMBEDDING_DIMS:
+        conn.execute(
+            text(
+                f"DROP INDEX IF EXISTS ix_document_chunks_embedding_{dim}_halfvec_hnsw"
+            )
+        )
+    conn.execute(
+        text(
+            "ALTER TABLE document_chunks "
+            "ALTER COLUMN embedding TYPE halfvec USING embedding::halfvec"
+        )
+    )
+    conn.execute(
+        text(
+            "ALTER TABLE document_chunks ADD CONSTRAINT "
+            "ck_document_chunks_embedding_unit_norm "
+            "CHECK (abs(l2_norm(embedding) - 1.0) < 1e-3)"
+        )
+    )
+
+
+JSON_COLUMNS = [
+    ("documents", "toc"),
+    ("generated_quizzes", "quiz_content"),
+    ("document_chunks", "chunk_metadata"),
+    ("generated_lessons", "content"),
+    ("generated_flashcards", "flashcards"),
+    ("generated_mindmaps", "mindmap_content"),
+    ("generated_podcasts", "script"),
+]
+
+
+def jsonb_columns(conn):
+    # jsonb is stored pre-parsed; ALTER ... TYPE is a no-op when already jsonb
+    for table, column in JSON_COLUMNS:
+        conn.execute(
+            text(
+                f"ALTER TABLE {table} ALTER COLUMN {column} TYPE JSONB USING {column}::jsonb"
+            )
+        )
+
+
+TIMESTAMP_COLUMNS = [
+    ("workspaces", "created_at"),
+    ("documents", "created_at"),
+    ("generated_quizzes", "created_at"),
+    ("messages", "created_at"),
+    ("generated_lessons", "created_at"),
+    ("generated_flashcards", "created_at"),
+    ("generated_mindmaps", "created_at"),
+    ("generated_podcasts", "created_at"),
+    ("app_settings", "updated_at"),
+]
+
+
+def timestamptz_columns(conn):
+    # Existing naive values were written with utcnow()
+    for table, column in TIMESTAMP_COLUMNS:
+        data_type = conn.execute(
+            text(
+                "SELECT data_type FROM information_schema.columns "
+                "WHERE table_name = :table AND column_name = :column"
+            ),
+            {"table": table, "column": column},
+        ).scalar()
+        if data_type == "timestamp without time zone":
+            conn.execute(
+                text(
+                    f"ALTER TABLE {table} ALTER COLUMN {column} "
+                    f"TYPE TIMESTAMPTZ USING {column} AT TIME ZONE 'UTC'"
+                )
+            )
+        conn.execute(
+            text(f"ALTER TABLE {table} ALTER COLUMN {column} SET DEFAULT now()")
+        )
+
+
+def document_progress(conn):
+    conn.execute(
+        text(
+            "ALTER TABLE documents ADD COLUMN IF NOT EXISTS progress INTEGER NOT NULL DEFAULT 0"
+        )
+    )
+
+
+def workspace_dim_index(conn):
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_document_chunks_workspace_dim "
+            "ON document_chunks (workspace_id, embedding_dim)"
+        )
+    )
+
+
+HNSW_OPTIONS = {"m": 24, "ef_construction": 128}
+
+
+def tune_hnsw_indexes(conn):
+    # The only step that builds the halfvec HNSW indexes: missing ones are
+    # created and ones with other graph options rebuilt, each CONCURRENTLY
+    # under a temporary name and swapped in, so search keeps working during
+    # the build.
+    conn.execute(
+        text(
+            "SET maintenance_work_mem = "
+            f"'{os.getenv('MIGRATE_MAINTENANCE_WORK_MEM', '2GB')}'"
+        )
+    )
+    conn.execute(text("SET max_parallel_maintenance_workers = 7"))
+    wanted = sorted(f"{key}={value}" for key, value in HNSW_OPTIONS.items())
+    for dim in EMBEDDING_DIMS:
+        name = f"ix_document_chunks_embedding_{dim}_halfvec_hnsw"
+        options = conn.execute(
+            text("SELECT reloptions FROM pg_class WHERE relname = :name"),
+            {"name": name},
+        ).scalar()
+        if options is not None and sorted(options) == wanted:
+            continue
+        # A previously interrupted build leaves an INVALID index behind
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}_new"))
+        conn.execute(
+            text(
+                f"CREATE INDEX CONCURRENTLY {name}_new "
+                f"ON document_chunks USING hnsw "
+                f"(CAST(embedding AS HALFVEC({dim})) halfvec_ip_ops) "
+                f"WITH (m = {HNSW_OPTIONS['m']}, "
+                f"ef_construction = {HNSW_OPTIONS['ef_construction']}) "
+                f"WHERE embedding_dim = {dim}"
+            )
+        )
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        conn.execute(text(f"ALTER INDEX {name}_new RENAME TO {name}"))
+
+
+# Applied in order; every step is idempotent so the script can be re-run safely.
+MIGRATIONS = [
+    normalize_embeddings,
+    halfvec_indexes,
+    single_embedding_column,
+    halfvec_embedding_column,
+    jsonb_columns,
+    timestamptz_columns,
+    document_progress,
+    workspace_dim_index,
+    tune_hnsw_indexes,
+]
+
+# CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction block
+AUTOCOMMIT_MIGRATIONS = {tune_hnsw_indexes}
+
+
+def migrate():
+    for step in MIGRATIONS:
+        if step in AUTOCOMMIT_MIGRATIONS:
+            with engine.connect().execution_options(
+                isolation_level="AUTOCOMMIT"
+            ) as conn:
+                step(conn)
+            print(f"Applied {step.__name__}.")
+            continue
+        with engine.connect() as conn:
+            trans = conn.begin()
+            try:
+                step(conn)
+                trans.commit()
+                print(f"Applied {step.__name__}.")
+            except Exception as e:
+                trans.rollback()
+                print(f"Failed {step.__name__}: {e}")
+                raise
+
+
+if __name__ == "__main__":
+    migrate()
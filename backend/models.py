@@ -1,15 +1,21 @@
 from typing import List, Optional, Any
 from sqlalchemy import (
+    CheckConstraint,
+    Index,
     Integer,
+    LargeBinary,
+    SmallInteger,
     String,
     Text,
     DateTime,
     ForeignKey,
-    JSON,
     Boolean,
+    cast,
+    func,
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship, Mapped, mapped_column
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import HALFVEC
 from backend.database import Base
 import datetime
 
@@ -20,7 +26,7 @@ class Workspace(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String, index=True)
     created_at: Mapped[datetime.datetime] = mapped_column(
-        DateTime, default=datetime.datetime.utcnow
+        DateTime(timezone=True), server_default=func.now()
     )
 
     # Workspace-specific AI Settings (if None, use global AppSettings)
@@ -64,13 +70,15 @@ class Document(Base):
     embedding_provider: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     embedding_model: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     created_at: Mapped[datetime.datetime] = mapped_column(
-        DateTime, default=datetime.datetime.utcnow
+        DateTime(timezone=True), server_default=func.now()
     )
     status: Mapped[str] = mapped_column(
         String, default="pending"
     )  # pending, processing, completed, failed
+    # Percent of pages embedded and stored while status is "processing"
+    progress: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
     summary: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
-    toc: Mapped[Optional[Any]] = mapped_column(JSON, nullable=True)
+    toc: Mapped[Optional[Any]] = mapped_column(JSONB, nullable=True)
     error_message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
 
     workspace: Mapped["Workspace"] = relationship(
@@ -87,16 +95,34 @@ class GeneratedQuiz(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     workspace_id: Mapped[int] = mapped_column(Integer, ForeignKey("workspaces.id"))
     topic: Mapped[str] = mapped_column(String)
-    quiz_content: Mapped[Any] = mapped_column(JSON)
+    quiz_content: Mapped[Any] = mapped_column(JSONB)
     created_at: Mapped[datetime.datetime] = mapped_column(
-        DateTime, default=datetime.datetime.utcnow
+        DateTime(timezone=True), server_default=func.now()
     )
 
     workspace: Mapped["Workspace"] = relationship("Workspace", back_populates="quizzes")
 
 
+# Embedding dimensions that get their own partial ANN index
+EMBEDDING_DIMS = (384, 768, 1024, 1536)
+
+
 class DocumentChunk(Base):
     __tablename__ = "document_chunks"
+    # Embeddings are stored unit-normalized, so inner product (<#>) ranks exactly
+    # like cosine distance while skipping the per-comparison norm computation.
+    __table_args__ = (
+        CheckConstraint(
+            "abs(l2_norm(embedding) - 1.0) < 1e-3",
+            name="ck_document_chunks_embedding_unit_norm",
+        ),
+        CheckConstraint(
+            "vector_dims(embedding) = embedding_dim",
+            name="ck_document_chunks_embedding_dim",
+        ),
+        # Every search and cache lookup filters on both columns
+        Index("ix_document_chunks_workspace_dim", "workspace_id", "embedding_dim"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     document_id: Mapped[int] = mapped_column(Integer, ForeignKey("documents.id"))
@@ -106,25 +132,33 @@ class DocumentChunk(Base):
     content: Mapped[str] = mapped_column(Text)
     chunk_index: Mapped[int] = mapped_column(Integer)
 
-    # Supported Vector Dimensions
-    embedding_1536: Mapped[Optional[Any]] = mapped_column(
-        Vector(1536), nullable=True
-    )  # OpenAI / Large HF
-    embedding_1024: Mapped[Optional[Any]] = mapped_column(
-        Vector(1024), nullable=True
-    )  # Large HF (BGE-Large)
-    embedding_768: Mapped[Optional[Any]] = mapped_column(
-        Vector(768), nullable=True
-    )  # Mistral / Mid HF
-    embedding_384: Mapped[Optional[Any]] = mapped_column(
-        Vector(384), nullable=True
-    )  # MiniLM / Small HF
-
-    chunk_metadata: Mapped[Optional[Any]] = mapped_column(JSON, nullable=True)
+    # Untyped half-precision (FP16) vector column, half the bytes of float32 per
+    # row and per distance computation; embedding_dim tags which model space a
+    # row belongs to
+    embedding: Mapped[Any] = mapped_column(HALFVEC(), nullable=False)
+    embedding_dim: Mapped[int] = mapped_column(SmallInteger, index=True)
+
+    chunk_metadata: Mapped[Optional[Any]] = mapped_column(JSONB, nullable=True)
 
     document: Mapped["Document"] = relationship("Document", back_populates="chunks")
 
 
+# HNSW indexes over the embedding, one partial index per dimension (the cast
+# gives each index a fixed dimension). They index the stored halfvec values
+# themselves, so search takes their top k as is.
+for _dim in EMBEDDING_DIMS:
+    Index(
+        f"ix_document_chunks_embedding_{_dim}_halfvec_hnsw",
+        cast(DocumentChunk.__table__.c.embedding, HALFVEC(_dim)).label(
+            f"embedding_{_dim}_halfvec"
+        ),
+        postgresql_using="hnsw",
+        postgresql_with={"m": 24, "ef_construction": 128},
+        postgresql_ops={f"embedding_{_dim}_halfvec": "halfvec_ip_ops"},
+        postgresql_where=DocumentChunk.__table__.c.embedding_dim == _dim,
+    )
+
+
 class Message(Base):
     __tablename__ = "messages"
 
@@ -133,7 +167,7 @@ class Message(Base):
     role: Mapped[str] = mapped_column(String)  # user, assistant
     content: Mapped[str] = mapped_column(Text)
     created_at: Mapped[datetime.datetime] = mapped_column(
-        DateTime, default=datetime.datetime.utcnow
+        DateTime(timezone=True), server_default=func.now()
     )
 
     workspace: Mapped["Workspace"] = relationship(
@@ -147,10 +181,10 @@ class GeneratedLesson(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     workspace_id: Mapped[int] = mapped_column(Integer, ForeignKey("workspaces.id"))
     topic: Mapped[str] = mapped_column(String)
-    content: Mapped[Any] = mapped_column(JSON)
+    content: Mapped[Any] = mapped_column(JSONB)
     audio_path: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     created_at: Mapped[datetime.datetime] = mapped_column(
-        DateTime, default=datetime.datetime.utcnow
+        DateTime(timezone=True), server_default=func.now()
     )
 
     workspace: Mapped["Workspace"] = relationship("Workspace", back_populates="lessons")
@@ -162,9 +196,9 @@ class GeneratedFlashcard(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     workspace_id: Mapped[int] = mapped_column(Integer, ForeignKey("workspaces.id"))
     topic: Mapped[str] = mapped_column(String)
-    flashcards: Mapped[Any] = mapped_column(JSON)
+    flashcards: Mapped[Any] = mapped_column(JSONB)
     created_at: Mapped[datetime.datetime] = mapped_column(
-        DateTime, default=datetime.datetime.utcnow
+        DateTime(timezone=True), server_default=func.now()
     )
 
     workspace: Mapped["Workspace"] = relationship(
@@ -178,9 +212,9 @@ class GeneratedMindMap(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     workspace_id: Mapped[int] = mapped_column(Integer, ForeignKey("workspaces.id"))
     topic: Mapped[str] = mapped_column(String)
-    mindmap_content: Mapped[Any] = mapped_column(JSON)
+    mindmap_content: Mapped[Any] = mapped_column(JSONB)
     created_at: Mapped[datetime.datetime] = mapped_column(
-        DateTime, default=datetime.datetime.utcnow
+        DateTime(timezone=True), server_default=func.now()
     )
 
     workspace: Mapped["Workspace"] = relationship(
@@ -194,7 +228,7 @@ class GeneratedPodcast(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     workspace_id: Mapped[int] = mapped_column(Integer, ForeignKey("workspaces.id"))
     topic: Mapped[str] = mapped_column(String)
-    script: Mapped[Any] = mapped_column(JSON)
+    script: Mapped[Any] = mapped_column(JSONB)
     audio_path: Mapped[str] = mapped_column(String)
     podcast_type: Mapped[str] = mapped_column(String)  # single, duo
     voice_a: Mapped[Optional[str]] = mapped_column(
@@ -204,7 +238,7 @@ class GeneratedPodcast(Base):
         String, nullable=True
     )  # Second speaker voice ID
     created_at: Mapped[datetime.datetime] = mapped_column(
-        DateTime, default=datetime.datetime.utcnow
+        DateTime(timezone=True), server_default=func.now()
     )
 
     workspace: Mapped["Workspace"] = relationship(
@@ -233,5 +267,20 @@ class AppSettings(Base):
     )  # "openai" or "ollama"
     ollama_vision_model: Mapped[str] = mapped_column(String, default="llava")
     updated_at: Mapped[datetime.datetime] = mapped_column(
-        DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
     )
+
+
+class EmbeddingCache(Base):
+    """
+    Chunk vectors keyed by embedding model and a hash of the chunk text, so
+    re-uploaded or overlapping documents skip the embedding call.
+    """
+
+    __tablename__ = "embedding_cache"
+
+    # "provider/model" key, matching the in-process cache in embed_texts
+    model_key: Mapped[str] = mapped_column(Text, primary_key=True)
+    # sha256 of the whitespace-normalized chunk text
+    content_hash: Mapped[bytes] = mapped_column(LargeBinary, primary_key=True)
+    embedding: Mapped[Any] = mapped_column(HALFVEC(), nullable=False)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 from datetime import datetime
 
@@ -19,13 +19,13 @@ class DocumentOut(BaseModel):
     file_path: str
     file_type: Optional[str]
     status: str
+    progress: int = 0
     embedding_provider: Optional[str] = None
     embedding_model: Optional[str] = None
     error_message: Optional[str] = None
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class WorkspaceOut(BaseModel):
@@ -40,65 +40,80 @@ class WorkspaceOut(BaseModel):
     llm_model: Optional[str] = "gpt-4o"
     ollama_base_url: Optional[str] = "http://localhost:11434"
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class WorkspaceDetailOut(WorkspaceOut):
     documents: List[DocumentOut]
 
 
-class Flashcard(BaseModel):
+class LLMOutput(BaseModel):
+    """
+    Base for structured LLM output. Unknown keys the model adds are dropped
+    instead of failing validation, and the core schema is built at import.
+    """
+
+    model_config = ConfigDict(extra="ignore", defer_build=False)
+
+
+class Flashcard(LLMOutput):
     front: str
     back: str
 
 
-class FlashcardSet(BaseModel):
+class FlashcardSet(LLMOutput):
     cards: List[Flashcard]
 
 
-class QuizQuestion(BaseModel):
+class QuizQuestion(LLMOutput):
     question: str
     options: List[str]
     correct_answer_index: int
     explanation: str
 
 
-class Quiz(BaseModel):
+class Quiz(LLMOutput):
     title: str
     questions: List[QuizQuestion]
 
 
-class LessonSection(BaseModel):
+class LessonSection(LLMOutput):
     title: str
     content: str
     key_points: List[str]
 
 
-class LessonPlan(BaseModel):
+class LessonPlan(LLMOutput):
     topic: str
     sections: List[LessonSection]
     audio_path: Optional[str] = None
 
 
-class MindMapNode(BaseModel):
+class MindMapNode(LLMOutput):
     id: str
     label: str
     type: str = "default"  # input, output, default
 
 
-class MindMapEdge(BaseModel):
+class MindMapEdge(LLMOutput):
     source: str
     target: str
     label: str = ""
 
 
-class MindMap(BaseModel):
+class MindMap(LLMOutput):
     nodes: List[MindMapNode]
     edges: List[MindMapEdge]
 
 
-class PodcastDialogueItem(BaseModel):
+class StudyPack(LLMOutput):
+    lesson: LessonPlan
+    flashcards: FlashcardSet
+    quiz: Quiz
+    mind_map: MindMap
+
+
+class PodcastDialogueItem(LLMOutput):
     speaker: str
     text: str
     voice: str
@@ -106,7 +121,7 @@ class PodcastDialogueItem(BaseModel):
     gender: str = ""
 
 
-class Podcast(BaseModel):
+class Podcast(LLMOutput):
     topic: str
     script: List[PodcastDialogueItem]
     audio_path: str = ""
@@ -128,8 +143,18 @@ class AppSettings(BaseModel):
     ollama_vision_model: Optional[str] = "llava"
     updated_at: Optional[datetime] = None
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class AppSettingsSnapshot(AppSettings):
+    """
+    Read-only copy of the settings row shared across requests and threads;
+    assigning to it raises instead of silently changing everyone's settings.
+    """
+
+    id: Optional[int] = None
+
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 
 class AppSettingsUpdate(BaseModel):
@@ -142,3 +167,28 @@ class AppSettingsUpdate(BaseModel):
     enable_vision_processing: Optional[bool] = None
     vision_provider: Optional[str] = None
     ollama_vision_model: Optional[str] = None
+
+
+# Build every validator up front so the first request to each endpoint
+# doesn't pay for schema construction.
+for _model in (
+    Flashcard,
+    FlashcardSet,
+    QuizQuestion,
+    Quiz,
+    LessonSection,
+    LessonPlan,
+    MindMapNode,
+    MindMapEdge,
+    MindMap,
+    StudyPack,
+    PodcastDialogueItem,
+    Podcast,
+    DocumentOut,
+    WorkspaceOut,
+    WorkspaceDetailOut,
+    AppSettings,
+    AppSettingsSnapshot,
+    AppSettingsUpdate,
+):
+    _model.model_rebuild(force=True)
@@ -1,3 +1,4 @@
+import gc
 import json
 import requests
 import asyncio
@@ -65,6 +66,33 @@ async def stream_ollama_download(
         yield f"data: {json.dumps({'error': str(e)})}\n\n"
 
 
+def _probe_hf_dimension(model_name: str) -> Optional[int]:
+    """
+    Load the model once to read its dimension, then release it right away so
+    verifying several models in a row doesn't pin each one in memory.
+    """
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    model = None
+    try:
+        model = HuggingFaceEmbeddings(model_name=model_name)
+        client = getattr(model, "client", getattr(model, "_client", None))
+        if client is None:
+            return None
+        return client.get_sentence_embedding_dimension()
+    finally:
+        client = None
+        del model
+        gc.collect()
+        try:
+            import torch
+
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except Exception:
+            pass
+
+
 async def stream_hf_download(model_name: str) -> AsyncGenerator[str, None]:
     """
     Streams progress from Hugging Face snapshot_download.
@@ -72,23 +100,25 @@ async def stream_hf_download(model_name: str) -> AsyncGenerator[str, None]:
     loop = asyncio.get_running_loop()
     queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
 
-    async def check_dimension():
+    async def check_dimension(local_path: str):
         try:
-            from langchain_huggingface import HuggingFaceEmbeddings
-            from backend.services.embeddings import SUPPORTED_DIMS
-
-            # Load model briefly to check dim
-            model = HuggingFaceEmbeddings(model_name=model_name)
-            client = getattr(model, "client", getattr(model, "_client", None))
-            if client is None:
-                await queue.put(
-                    {
-                        "error": "Could not access the underlying SentenceTransformer client."
-                    }
-                )
-                return False
+            from backend.services.embeddings import (
+                SUPPORTED_DIMS,
+                resolve_hf_embedding_dim,
+            )
 
-            dim = client.get_sentence_embedding_dimension()
+            # Read the dimension from the registry / downloaded config files first;
+            # only models without usable config metadata need a probe load.
+            dim = resolve_hf_embedding_dim(model_name, local_path)
+            if dim is None:
+                dim = await asyncio.to_thread(_probe_hf_dimension, model_name)
+                if dim is None:
+                    await queue.put(
+                        {
+                            "error": "Could not access the underlying SentenceTransformer client."
+                        }
+                    )
+                    return False
 
             if dim not in SUPPORTED_DIMS:
                 await queue.put(
@@ -105,7 +135,7 @@ async def stream_hf_download(model_name: str) -> AsyncGenerator[str, None]:
 
     def run_download():
         try:
-            snapshot_download(
+            local_path = snapshot_download(
                 repo_id=model_name,
                 tqdm_class=lambda *args, **kwargs: ProgressTqdm(
                     *args, queue=queue, loop=loop, **kwargs
@@ -114,7 +144,7 @@ async def stream_hf_download(model_name: str) -> AsyncGenerator[str, None]:
 
             # After download, check dimension
             async def verify_and_finish():
-                if await check_dimension():
+                if await check_dimension(local_path):
                     await queue.put({"status": "success", "progress": 100})
 
             asyncio.run_coroutine_threadsafe(verify_and_finish(), loop)
@@ -1,15 +1,30 @@
+import asyncio
+import contextlib
+import functools
+import hashlib
+import json
 import os
-from typing import Optional, Tuple
+import platform
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, cast
 
+import numpy as np
+import openai
+from cachetools import LRUCache, cached
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_core.embeddings import Embeddings
 from langchain_openai import OpenAIEmbeddings
 from pydantic import SecretStr
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
-from backend.models import Workspace
+from backend.models import EMBEDDING_DIMS, EmbeddingCache, Workspace
 
-SUPPORTED_DIMS = [384, 768, 1024, 1536]
+# Dimensions with a partial ANN index on document_chunks
+SUPPORTED_DIMS = list(EMBEDDING_DIMS)
 
 # Known dimensions for OpenAI embedding models (we only support dims with DB columns).
 OPENAI_EMBED_DIMS = {
@@ -18,6 +33,28 @@ OPENAI_EMBED_DIMS = {
 }
 
 
+# Known dimensions for popular sentence-transformers models, so they can be
+# validated without loading any weights.
+HF_EMBED_DIMS = {
+    "sentence-transformers/all-MiniLM-L6-v2": 384,
+    "sentence-transformers/all-MiniLM-L12-v2": 384,
+    "sentence-transformers/multi-qa-MiniLM-L6-cos-v1": 384,
+    "sentence-transformers/all-mpnet-base-v2": 768,
+    "sentence-transformers/multi-qa-mpnet-base-dot-v1": 768,
+    "BAAI/bge-small-en-v1.5": 384,
+    "BAAI/bge-base-en-v1.5": 768,
+    "BAAI/bge-large-en-v1.5": 1024,
+    "intfloat/e5-small-v2": 384,
+    "intfloat/e5-base-v2": 768,
+    "intfloat/e5-large-v2": 1024,
+    "nomic-ai/nomic-embed-text-v1.5": 768,
+}
+
+
+# Concurrent embedding requests per document (network-bound; keep under RPM)
+OPENAI_EMBED_CONCURRENCY = 8
+
+
 def resolve_openai_embedding_dim(model_name: str) -> int:
     """
     Resolve embedding dimension for a given OpenAI embedding model name.
@@ -26,31 +63,172 @@ def resolve_openai_embedding_dim(model_name: str) -> int:
     return OPENAI_EMBED_DIMS.get(model_name, 1536)
 
 
-def get_embeddings_model(
-    db: Session, workspace_id: Optional[int] = None
-) -> Tuple[Embeddings, int, str, str]:
+def _read_json(path: Path) -> dict:
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+@functools.lru_cache(maxsize=64)
+def resolve_hf_embedding_dim(
+    model_name: str, local_path: Optional[str] = None
+) -> Optional[int]:
     """
-    Factory to return the configured embedding model and its dimension.
-    Returns: (model_instance, dimension, provider, model_name)
+    Resolve the output dimension of a sentence-transformers model from the static
+    registry or from the config files of a downloaded snapshot.
+    Returns None when the dimension cannot be determined without loading the model.
     """
-    # Fetch global fallbacks from database
-    from backend.services.settings import get_app_settings
+    if model_name in HF_EMBED_DIMS:
+        return HF_EMBED_DIMS[model_name]
+    if not local_path:
+        return None
 
-    settings_db = get_app_settings(db)
+    root = Path(local_path)
 
-    provider = settings_db.embedding_provider
-    model_name = settings_db.embedding_model
-    api_key = settings_db.openai_api_key
+    # A trailing Dense module projects to its own output size, so it wins.
+    modules = []
+    try:
+        with (root / "modules.json").open("r", encoding="utf-8") as f:
+            modules = json.load(f)
+    except (OSError, ValueError):
+        pass
+    for module in reversed(modules if isinstance(modules, list) else []):
+        if isinstance(module, dict) and str(module.get("type", "")).endswith(".Dense"):
+            dense = _read_json(root / module.get("path", "") / "config.json")
+            if isinstance(dense.get("out_features"), int):
+                return dense["out_features"]
+            break
 
-    if workspace_id:
-        workspace = db.get(Workspace, workspace_id)
-        if workspace:
-            if workspace.embedding_provider:
-                provider = workspace.embedding_provider
-            if workspace.embedding_model:
-                model_name = workspace.embedding_model
-            # Note: We still use global API key for OpenAI unless we add per-workspace keys
+    pooling = _read_json(root / "1_Pooling" / "config.json")
+    if isinstance(pooling.get("word_embedding_dimension"), int):
+        return pooling["word_embedding_dimension"]
+
+    config = _read_json(root / "config.json")
+    for key in ("hidden_size", "d_model", "dim"):
+        if isinstance(config.get(key), int):
+            return config[key]
+    return None
+
+
+def _resolve_hf_device() -> str:
+    # Device selection:
+    # - default "auto" (prefer CUDA if available)
+    # - override with env var: RAG_HF_DEVICE=cpu|cuda|auto
+    device_pref = (os.getenv("RAG_HF_DEVICE") or "auto").strip().lower()
+    device = "cpu"
+    if device_pref != "cpu":
+        try:
+            import torch
+
+            if device_pref == "cuda" or (
+                device_pref == "auto" and torch.cuda.is_available()
+            ):
+                device = "cuda"
+        except Exception:
+            device = "cpu"
+    return device
+
+
+# Exported/quantized ONNX models for the "huggingface_onnx" provider
+ONNX_EXPORT_DIR = Path("storage/onnx")
+
+# Sentences per forward pass for local models. int8 ONNX kernels (VNNI/arm64
+# dot-product) need larger batches to stay saturated than PyTorch FP32 does.
+HF_ENCODE_BATCH_SIZE = 64
+ONNX_ENCODE_BATCH_SIZE = 256
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """
+    Minimal LangChain wrapper around a SentenceTransformer that was loaded with a
+    non-PyTorch backend (HuggingFaceEmbeddings always builds its own model).
+    """
+
+    def __init__(self, client: Any):
+        self.client = client
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.client.encode(
+            texts,
+            batch_size=ONNX_ENCODE_BATCH_SIZE,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        ).tolist()
 
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def _onnx_quantization_target() -> Optional[str]:
+    """
+    Pick the int8 ONNX variant for this CPU: arm64, avx512_vnni, avx512 or avx2.
+    """
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "arm64"
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            flags = next((line for line in f if line.startswith("flags")), "").split()
+    except OSError:
+        return None
+    if "avx512_vnni" in flags:
+        return "avx512_vnni"
+    if "avx512f" in flags:
+        return "avx512"
+    if "avx2" in flags:
+        return "avx2"
+    return None
+
+
+def _load_onnx_sentence_transformer(model_name: str) -> Any:
+    """
+    Load an int8-quantized ONNX build of a sentence-transformers model, exporting
+    and quantizing it locally the first time it is requested.
+    """
+    from sentence_transformers import (
+        SentenceTransformer,
+        export_dynamic_quantized_onnx_model,
+    )
+
+    target = _onnx_quantization_target()
+    if target is None:
+        return SentenceTransformer(model_name, backend="onnx", device="cpu")
+
+    file_name = f"onnx/model_qint8_{target}.onnx"
+    # Many hub repos already ship the quantized variants
+    try:
+        return SentenceTransformer(
+            model_name,
+            backend="onnx",
+            device="cpu",
+            model_kwargs={"file_name": file_name},
+        )
+    except Exception:
+        pass
+
+    export_dir = ONNX_EXPORT_DIR / model_name.replace("/", "__")
+    if not (export_dir / file_name).exists():
+        model = SentenceTransformer(model_name, backend="onnx", device="cpu")
+        model.save(str(export_dir))
+        export_dynamic_quantized_onnx_model(model, target, str(export_dir))
+    return SentenceTransformer(
+        str(export_dir),
+        backend="onnx",
+        device="cpu",
+        model_kwargs={"file_name": file_name},
+    )
+
+
+@functools.lru_cache(maxsize=8)
+def _build_embeddings(
+    provider: str, model_name: str, api_key: Optional[str], device: str
+) -> Tuple[Embeddings, int, str, str]:
+    """
+    Instantiate an embedding model. Cached per process so a model's weights
+    are loaded once, not on every ingestion or search call.
+    """
     if provider == "openai":
         if not api_key:
             raise ValueError(
@@ -68,6 +246,23 @@ def get_embeddings_model(
             model=model_name, api_key=SecretStr(api_key)
         )
         return (openai_embeddings, dim, provider, model_name)
+    elif provider == "huggingface_onnx":
+        mn = model_name if model_name else "sentence-transformers/all-MiniLM-L6-v2"
+        try:
+            client = _load_onnx_sentence_transformer(mn)
+        except Exception as e:
+            # Fall back to the PyTorch backend (e.g. onnxruntime/optimum missing)
+            print(f"--- ONNX backend unavailable for {mn} ({e}); using PyTorch ---")
+            model, dim, _, _ = _build_embeddings("huggingface", mn, None, device)
+            return model, dim, provider, mn
+
+        dim = client.get_sentence_embedding_dimension()
+        if dim not in SUPPORTED_DIMS:
+            raise ValueError(
+                f"Model '{mn}' has {dim} dimensions, which is not supported. "
+                f"Supported dimensions are: {', '.join(map(str, SUPPORTED_DIMS))}"
+            )
+        return SentenceTransformerEmbeddings(client), dim, provider, mn
     elif provider == "huggingface":
         # Uses local sentence-transformers models
         mn = model_name if model_name else "sentence-transformers/all-MiniLM-L6-v2"
@@ -75,22 +270,6 @@ def get_embeddings_model(
         print(f"--- Initializing Hugging Face model: {mn} ---")
         print("Note: If this is the first time, it may take a few minutes to download.")
 
-        # Device selection:
-        # - default "auto" (prefer CUDA if available)
-        # - override with env var: RAG_HF_DEVICE=cpu|cuda|auto
-        device_pref = (os.getenv("RAG_HF_DEVICE") or "auto").strip().lower()
-        device = "cpu"
-        if device_pref != "cpu":
-            try:
-                import torch
-
-                if device_pref == "cuda" or (
-                    device_pref == "auto" and torch.cuda.is_available()
-                ):
-                    device = "cuda"
-            except Exception:
-                device = "cpu"
-
         try:
             # NOTE:
             # `langchain_huggingface.HuggingFaceEmbeddings` passes `model_kwargs` directly to
@@ -135,3 +314,281 @@ def get_embeddings_model(
         return hf_embeddings, dim, provider, mn
     else:
         raise ValueError(f"Unsupported embedding provider: {provider}")
+
+
+def clear_embeddings_cache() -> None:
+    """
+    Drop cached embedding models (e.g. after settings change) so they are rebuilt.
+    """
+    _build_embeddings.cache_clear()
+
+
+def get_embeddings_model(
+    db: Session, workspace_id: Optional[int] = None
+) -> Tuple[Embeddings, int, str, str]:
+    """
+    Factory to return the configured embedding model and its dimension.
+    Returns: (model_instance, dimension, provider, model_name)
+    """
+    # Fetch global fallbacks from database
+    from backend.services.settings import get_app_settings
+
+    settings_db = get_app_settings(db)
+
+    provider = settings_db.embedding_provider
+    model_name = settings_db.embedding_model
+    api_key = settings_db.openai_api_key
+
+    if workspace_id:
+        workspace = db.get(Workspace, workspace_id)
+        if workspace:
+            if workspace.embedding_provider:
+                provider = workspace.embedding_provider
+            if workspace.embedding_model:
+                model_name = workspace.embedding_model
+            # Note: We still use global API key for OpenAI unless we add per-workspace keys
+
+    # Only the fields a provider actually uses go into the cache key
+    if provider == "openai":
+        return _build_embeddings(provider, model_name, api_key, "")
+    elif provider in ("huggingface", "huggingface_onnx"):
+        return _build_embeddings(provider, model_name, None, _resolve_hf_device())
+    else:
+        raise ValueError(f"Unsupported embedding provider: {provider}")
+
+
+def l2_normalize(vectors: Any) -> np.ndarray:
+    """
+    Scale vectors (a single vector or a 2-D batch) to unit length so inner product
+    equals cosine similarity. Zero vectors are left untouched.
+    """
+    arr = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(arr, axis=-1, keepdims=True)
+    return arr / np.where(norms == 0, 1.0, norms)
+
+
+def _sentence_transformer_client(model: Embeddings) -> Optional[Any]:
+    if not isinstance(model, (HuggingFaceEmbeddings, SentenceTransformerEmbeddings)):
+        return None
+    return getattr(model, "client", getattr(model, "_client", None))
+
+
+def is_local_embeddings(model: Embeddings) -> bool:
+    """
+    True for in-process sentence-transformers models (compute-bound, GIL released
+    during inference) as opposed to API-backed ones.
+    """
+    return _sentence_transformer_client(model) is not None
+
+
+def local_tokenizer(model: Embeddings) -> Optional[Tuple[Any, int]]:
+    """
+    (tokenizer, max sequence length) of an in-process sentence-transformers
+    model, or None for API-backed models.
+    """
+    client = _sentence_transformer_client(model)
+    tokenizer = getattr(client, "tokenizer", None)
+    if tokenizer is None:
+        return None
+    return tokenizer, int(getattr(client, "max_seq_length", None) or 512)
+
+
+def _openai_async_client(model: OpenAIEmbeddings) -> openai.AsyncOpenAI:
+    api_key = model.openai_api_key
+    return openai.AsyncOpenAI(
+        api_key=api_key.get_secret_value() if api_key else None,
+        organization=model.openai_organization,
+        base_url=model.openai_api_base,
+        max_retries=model.max_retries,
+    )
+
+
+async def embed_batch(
+    model: Embeddings,
+    texts: List[str],
+    batch_size: int = 128,
+    concurrency: int = 4,
+) -> np.ndarray:
+    """
+    Embed many texts with as few model calls as possible.
+    Local sentence-transformers models encode everything in a single call
+    (and sort by length internally); API-backed models get length-sorted,
+    fixed-size windows sent concurrently.
+    Returns a contiguous (len(texts), dim) float32 array of L2-normalized rows.
+    """
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+
+    client = _sentence_transformer_client(model)
+    if client is not None:
+        # encode() length-sorts internally, so each batch pads only to its
+        # own longest text
+        encode_batch_size = (
+            ONNX_ENCODE_BATCH_SIZE
+            if isinstance(model, SentenceTransformerEmbeddings)
+            else HF_ENCODE_BATCH_SIZE
+        )
+        vectors = await asyncio.to_thread(
+            client.encode,
+            texts,
+            batch_size=encode_batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        )
+        return np.asarray(vectors, dtype=np.float32)
+
+    # OpenAI calls go straight to the SDK's async client: one request per
+    # window, without LangChain's per-text tokenization and re-chunking.
+    is_openai = isinstance(model, OpenAIEmbeddings)
+    if is_openai:
+        concurrency = max(concurrency, OPENAI_EMBED_CONCURRENCY)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    # Windows of similar-length texts waste less padding; results are put
+    # back in input order below.
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    ordered = [texts[i] for i in order]
+    windows = [ordered[i : i + batch_size] for i in range(0, len(ordered), batch_size)]
+
+    # Every asyncio.run() gets a new event loop, and an httpx connection pool
+    # cannot outlive the loop it was first used on; so each run opens (and
+    # closes) its own OpenAI client instead of the model's cached one.
+    async with (
+        _openai_async_client(cast(OpenAIEmbeddings, model))
+        if is_openai
+        else contextlib.nullcontext()
+    ) as openai_client:
+
+        async def embed_window(window: List[str]) -> List[List[float]]:
+            async with semaphore:
+                if openai_client is None:
+                    # Sync API on a worker thread, for the same reason
+                    return await asyncio.to_thread(model.embed_documents, window)
+                response = await openai_client.embeddings.create(
+                    input=window, model=cast(OpenAIEmbeddings, model).model
+                )
+                return [item.embedding for item in response.data]
+
+        results = await asyncio.gather(*(embed_window(w) for w in windows))
+    vectors = [vector for result in results for vector in result]
+    unsorted: List[List[float]] = [[] for _ in texts]
+    for position, index in enumerate(order):
+        unsorted[index] = vectors[position]
+    # Stored vectors must be unit length (see DocumentChunk's norm check)
+    return l2_normalize(unsorted)
+
+
+# Recently computed chunk vectors, keyed by (model key, hash of normalized text).
+# Override with env var: RAG_EMBEDDING_CACHE_SIZE=<entries> (0 disables)
+EMBEDDING_CACHE_SIZE = int(os.getenv("RAG_EMBEDDING_CACHE_SIZE") or 50000)
+
+_vector_cache: "OrderedDict[Tuple[str, bytes], np.ndarray]" = OrderedDict()
+_vector_cache_lock = threading.Lock()
+
+
+def _text_digest(text: str) -> bytes:
+    # Whitespace-only differences (re-flowed headers/footers) share a vector
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).digest()
+
+
+def _load_cached_vectors(
+    db: Session, cache_key: str, digests: List[bytes]
+) -> Dict[bytes, np.ndarray]:
+    # One round trip for the whole window
+    rows = db.execute(
+        select(EmbeddingCache.content_hash, EmbeddingCache.embedding)
+        .where(EmbeddingCache.model_key == cache_key)
+        .where(EmbeddingCache.content_hash.in_(digests))
+    ).all()
+    return {row[0]: np.asarray(row[1], dtype=np.float32) for row in rows}
+
+
+def _store_cached_vectors(
+    db: Session, cache_key: str, vectors: Dict[bytes, np.ndarray]
+) -> None:
+    # Concurrent workers may embed the same text; the first insert wins
+    db.execute(
+        pg_insert(EmbeddingCache).on_conflict_do_nothing(),
+        [
+            {"model_key": cache_key, "content_hash": digest, "embedding": vector}
+            for digest, vector in vectors.items()
+        ],
+    )
+
+
+def embed_texts(
+    model: Embeddings,
+    texts: List[str],
+    batch_size: int = 128,
+    cache_key: Optional[str] = None,
+    db: Optional[Session] = None,
+) -> np.ndarray:
+    """
+    Synchronous entry point to `embed_batch` for ingestion workers.
+    With a `cache_key` (e.g. "provider/model"), duplicate texts are embedded
+    once and vectors are reused across documents from an in-process LRU and,
+    when `db` is given, from the embedding_cache table. New rows are added to
+    the caller's transaction.
+    """
+    if not texts or not cache_key:
+        return asyncio.run(embed_batch(model, texts, batch_size=batch_size))
+
+    keys = [(cache_key, _text_digest(text)) for text in texts]
+    hits: Dict[int, np.ndarray] = {}
+    misses: dict = {}
+    with _vector_cache_lock:
+        for i, key in enumerate(keys):
+            cached = _vector_cache.get(key)
+            if cached is not None:
+                _vector_cache.move_to_end(key)
+                hits[i] = cached
+            else:
+                misses.setdefault(key, texts[i])
+
+    fresh: Dict[Tuple[str, bytes], np.ndarray] = {}
+    if misses and db is not None:
+        stored = _load_cached_vectors(db, cache_key, [d for _, d in misses])
+        for key in list(misses):
+            if key[1] in stored:
+                fresh[key] = stored[key[1]]
+                del misses[key]
+
+    if misses:
+        computed = asyncio.run(
+            embed_batch(model, list(misses.values()), batch_size=batch_size)
+        )
+        embedded = dict(zip(misses, computed))
+        if db is not None:
+            _store_cached_vectors(
+                db, cache_key, {digest: v for (_, digest), v in embedded.items()}
+            )
+        fresh.update(embedded)
+
+    if EMBEDDING_CACHE_SIZE > 0 and fresh:
+        with _vector_cache_lock:
+            _vector_cache.update(fresh)
+            while len(_vector_cache) > EMBEDDING_CACHE_SIZE:
+                _vector_cache.popitem(last=False)
+
+    dim = len(next(iter(hits.values())) if hits else next(iter(fresh.values())))
+    vectors = np.empty((len(texts), dim), dtype=np.float32)
+    for i, key in enumerate(keys):
+        vectors[i] = hits[i] if i in hits else fresh[key]
+    return vectors
+
+
+# Query vectors for repeated searches, keyed by (model key, query text)
+_query_cache: LRUCache = LRUCache(maxsize=4096)
+
+
+@cached(
+    _query_cache,
+    key=lambda model, query, cache_key: (cache_key, query),
+    lock=threading.Lock(),
+)
+def embed_query(model: Embeddings, query: str, cache_key: str) -> np.ndarray:
+    """
+    Unit-length query vector; `cache_key` (e.g. "provider/model") identifies
+    the model in the in-process LRU.
+    """
+    return l2_normalize(model.embed_query(query))
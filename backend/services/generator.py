@@ -1,28 +1,88 @@
-from typing import Optional
+import functools
+import random
+import threading
+from typing import List, Optional, Tuple
+from cachetools import TTLCache, cached
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
-from backend.schemas import LessonPlan, FlashcardSet, Quiz, MindMap
+from backend.schemas import LessonPlan, FlashcardSet, Quiz, MindMap, StudyPack
 from langchain_openai import ChatOpenAI
 from langchain_ollama import ChatOllama
 from pydantic import SecretStr
 from langchain_core.prompts import ChatPromptTemplate
-from backend.models import Workspace
+from backend.models import Document, Workspace
 from backend.services.settings import get_app_settings
+from backend.services.retrieval import search_documents
 import requests
-import random
+
+# Pool size fetched once per topic; generators slice or sample from it
+CONTEXT_POOL_SIZE = 15
+
+# Chunks drawn from the pool for flashcards and quizzes
+CONTEXT_SAMPLE_SIZE = 5
+
+
+def _normalize_topic(topic: str) -> str:
+    return " ".join(topic.lower().split())
+
+
+def _workspace_version(db: Session, workspace_id: int) -> Tuple[int, Optional[int]]:
+    # Changes whenever a document finishes ingesting or is deleted. Ingestion
+    # runs in Celery workers, so the API process cannot simply be told to
+    # clear its caches.
+    count, max_id = db.execute(
+        select(func.count(), func.max(Document.id)).where(
+            Document.workspace_id == workspace_id, Document.status == "completed"
+        )
+    ).one()
+    return count, max_id
+
+
+@cached(
+    TTLCache(maxsize=512, ttl=300),
+    key=lambda topic, workspace_id, db, version: (
+        _normalize_topic(topic),
+        workspace_id,
+        version,
+    ),
+    lock=threading.Lock(),
+)
+def _cached_context_pool(
+    topic: str, workspace_id: int, db: Session, version: Tuple[int, Optional[int]]
+) -> List[str]:
+    chunks = search_documents(topic, workspace_id, db, k=CONTEXT_POOL_SIZE)
+    return [c["content"] for c in chunks]
+
+
+def _retrieve_context_pool(topic: str, workspace_id: int, db: Session) -> List[str]:
+    """
+    Chunk contents for a topic, most relevant first. Cached briefly so that
+    generating a lesson, flashcards, quiz and mind map on one topic runs a
+    single vector search; a newly completed or deleted document starts a new
+    cache entry. Only plain strings are cached, never ORM rows.
+    """
+    version = _workspace_version(db, workspace_id)
+    return _cached_context_pool(topic, workspace_id, db, version)
 
 
 def _normalize_base_url(url: str) -> str:
     return url.rstrip("/")
 
 
+# Keep-alive connection pool for Ollama probes
+_ollama_http = requests.Session()
+
+
+@cached(TTLCache(maxsize=32, ttl=30), lock=threading.Lock())
 def _ollama_preflight(base_url: str, model_name: str) -> None:
     """
     Best-effort validation that Ollama is reachable and the model exists locally.
     Raises ValueError with a user-facing message on failure.
+    Successful checks are remembered for 30s; failures are never cached.
     """
     base_url = _normalize_base_url(base_url)
     try:
-        resp = requests.get(f"{base_url}/api/tags", timeout=2)
+        resp = _ollama_http.get(f"{base_url}/api/tags", timeout=2)
     except Exception as e:
         raise ValueError(
             f"Could not reach Ollama at {base_url}. Is Ollama running? (Error: {e})"
@@ -59,7 +119,11 @@ def _ollama_preflight(base_url: str, model_name: str) -> None:
         )
 
 
-def get_llm(db: Session, workspace_id: Optional[int] = None, temperature: float = 0.7):
+# (provider, model_name, api_key, ollama_base_url)
+LLMConfig = Tuple[str, str, Optional[str], str]
+
+
+def _resolve_llm_config(db: Session, workspace_id: Optional[int] = None) -> LLMConfig:
     settings_db = get_app_settings(db)
 
     # Defaults from Global Settings
@@ -91,15 +155,14 @@ def get_llm(db: Session, workspace_id: Optional[int] = None, temperature: float
             if workspace.ollama_base_url:
                 ollama_url = workspace.ollama_base_url
 
+    return provider, model_name, api_key, ollama_url
+
+
+def _check_llm_config(config: LLMConfig) -> None:
+    provider, model_name, api_key, ollama_url = config
     if provider == "openai":
         if not api_key:
             raise ValueError("OpenAI API Key is not configured in global settings.")
-
-        return ChatOpenAI(
-            model=model_name,
-            temperature=temperature,
-            api_key=SecretStr(api_key),
-        )
     elif provider == "ollama":
         # Common misconfig: model name left as "gpt-4o" when switching to Ollama.
         if model_name.startswith("gpt-"):
@@ -109,120 +172,158 @@ def get_llm(db: Session, workspace_id: Optional[int] = None, temperature: float
                 "and download/pull it first."
             )
         _ollama_preflight(ollama_url, model_name)
-        return ChatOllama(
-            model=model_name,
-            temperature=temperature,
-            base_url=ollama_url,
-        )
     else:
         raise ValueError(f"Unsupported LLM provider: {provider}")
 
 
-def generate_lesson_plan(topic: str, workspace_id: int, db: Session) -> LessonPlan:
-    # 1. Retrieve context
-    from backend.services.rag import search_documents
-
-    chunks = search_documents(topic, workspace_id, db, k=8)
-    context = "\n".join([c.content for c in chunks])
-
-    # 2. Structured generation
-    llm = get_llm(db, workspace_id)
-    structured_llm = llm.with_structured_output(LessonPlan)
-
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            (
-                "system",
-                "You are an expert educational content creator. Create a comprehensive lesson plan based strictly on the provided context.",
-            ),
-            ("user", "Context: {context}\n\nTopic: {topic}\n\nGenerate a lesson plan:"),
-        ]
+@functools.lru_cache(maxsize=8)
+def _build_llm(config: LLMConfig, temperature: float):
+    """
+    Chat model client per (config, temperature). Reusing it keeps the provider's
+    HTTP connection pool warm between requests.
+    """
+    provider, model_name, api_key, ollama_url = config
+    if provider == "openai":
+        return ChatOpenAI(
+            model=model_name,
+            temperature=temperature,
+            api_key=SecretStr(api_key or ""),
+        )
+    return ChatOllama(
+        model=model_name,
+        temperature=temperature,
+        base_url=ollama_url,
     )
 
-    chain = prompt | structured_llm
-    return chain.invoke({"context": context, "topic": topic})
 
+def get_llm(db: Session, workspace_id: Optional[int] = None, temperature: float = 0.7):
+    config = _resolve_llm_config(db, workspace_id)
+    _check_llm_config(config)
+    return _build_llm(config, temperature)
 
-def generate_flashcards(topic: str, workspace_id: int, db: Session) -> FlashcardSet:
-    # Fetch larger pool of chunks to add variety
-    from backend.services.rag import search_documents
-
-    chunks = search_documents(topic, workspace_id, db, k=15)
 
-    # Shuffle and pick top 5-7 to ensure context varies but stays relevant
-    if chunks:
-        selected_chunks = random.sample(chunks, min(len(chunks), 5))
-    else:
-        selected_chunks = []
+# Every generator sends the same system prompt and a "Context ... Topic ..."
+# prefix, with only the task instructions at the end. Providers that cache
+# prompt prefixes (OpenAI prompt caching, Ollama/llama.cpp prompt reuse) then
+# prefill the shared context once when several artifacts are made per topic.
+GENERATION_SYSTEM_PROMPT = (
+    "You are an expert educational content creator. "
+    "Base everything you create strictly on the provided context."
+)
 
-    context = "\n".join([c.content for c in selected_chunks])
+GENERATION_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system", GENERATION_SYSTEM_PROMPT),
+        ("user", "Context: {context}\n\nTopic: {topic}\n\n{instructions}"),
+    ]
+)
 
-    llm = get_llm(db, workspace_id)
-    structured_llm = llm.with_structured_output(FlashcardSet)
 
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            (
-                "system",
-                "Create a set of 5-10 flashcards (Front/Back) based on the context to help a student learn the key concepts. Avoid duplicates.",
-            ),
-            ("user", "Context: {context}\n\nTopic: {topic}\n\nGenerate flashcards:"),
-        ]
+def _sampled_context(topic: str, workspace_id: int, db: Session) -> str:
+    """
+    A random but relevance-weighted subset of the topic's pool, drawn afresh on
+    every call so regenerated flashcards and quizzes vary. Scaling each rank by
+    random() shuffles the pool while still favouring the closest chunks.
+    """
+    pool = _retrieve_context_pool(topic, workspace_id, db)
+    ranks = sorted(range(len(pool)), key=lambda i: (i + 1) * random.random())
+    return "\n".join(pool[i] for i in sorted(ranks[:CONTEXT_SAMPLE_SIZE]))
+
+
+def _top_context(topic: str, workspace_id: int, db: Session) -> str:
+    return "\n".join(_retrieve_context_pool(topic, workspace_id, db)[:8])
+
+
+@functools.lru_cache(maxsize=32)
+def _chain_for(config: LLMConfig, temperature: float, schema: type):
+    # with_structured_output compiles the schema into a tool/JSON binding once
+    structured_llm = _build_llm(config, temperature).with_structured_output(schema)
+    return GENERATION_PROMPT | structured_llm
+
+
+def _generate(
+    db: Session,
+    workspace_id: int,
+    schema: type,
+    context: str,
+    topic: str,
+    instructions: str,
+    temperature: float = 0.7,
+):
+    config = _resolve_llm_config(db, workspace_id)
+    _check_llm_config(config)
+    chain = _chain_for(config, temperature, schema)
+    return chain.invoke(
+        {"context": context, "topic": topic, "instructions": instructions}
     )
 
-    chain = prompt | structured_llm
-    return chain.invoke({"context": context, "topic": topic})
-
 
-def generate_quiz(topic: str, workspace_id: int, db: Session) -> Quiz:
-    # Fetch larger pool of chunks
-    from backend.services.rag import search_documents
+def generate_lesson_plan(topic: str, workspace_id: int, db: Session) -> LessonPlan:
+    return _generate(
+        db,
+        workspace_id,
+        LessonPlan,
+        _top_context(topic, workspace_id, db),
+        topic,
+        "Create a comprehensive lesson plan based strictly on the provided context. "
+        "Generate a lesson plan:",
+    )
 
-    chunks = search_documents(topic, workspace_id, db, k=15)
 
-    # Randomly select subset
-    if chunks:
-        selected_chunks = random.sample(chunks, min(len(chunks), 5))
-    else:
-        selected_chunks = []
-
-    context = "\n".join([c.content for c in selected_chunks])
+def generate_flashcards(topic: str, workspace_id: int, db: Session) -> FlashcardSet:
+    return _generate(
+        db,
+        workspace_id,
+        FlashcardSet,
+        _sampled_context(topic, workspace_id, db),
+        topic,
+        "Create a set of 5-10 flashcards (Front/Back) based on the context to help "
+        "a student learn the key concepts. Avoid duplicates. Generate flashcards:",
+    )
 
-    llm = get_llm(db, workspace_id)
-    structured_llm = llm.with_structured_output(Quiz)
 
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            (
-                "system",
-                "Create a 5-question multiple choice quiz based on the context. Ensure questions are diverse.",
-            ),
-            ("user", "Context: {context}\n\nTopic: {topic}\n\nGenerate quiz:"),
-        ]
+def generate_quiz(topic: str, workspace_id: int, db: Session) -> Quiz:
+    return _generate(
+        db,
+        workspace_id,
+        Quiz,
+        _sampled_context(topic, workspace_id, db),
+        topic,
+        "Create a 5-question multiple choice quiz based on the context. "
+        "Ensure questions are diverse. Generate quiz:",
     )
 
-    chain = prompt | structured_llm
-    return chain.invoke({"context": context, "topic": topic})
-
 
 def generate_mind_map(topic: str, workspace_id: int, db: Session) -> MindMap:
-    from backend.services.rag import search_documents
-
-    chunks = search_documents(topic, workspace_id, db, k=8)
-    context = "\n".join([c.content for c in chunks])
-
-    llm = get_llm(db, workspace_id)
-    structured_llm = llm.with_structured_output(MindMap)
-
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            (
-                "system",
-                "Create a mind map with 10-15 nodes based on the context to visualize the relationships between key concepts. Return a list of nodes and edges.",
-            ),
-            ("user", "Context: {context}\n\nTopic: {topic}\n\nGenerate mind map:"),
-        ]
+    return _generate(
+        db,
+        workspace_id,
+        MindMap,
+        _top_context(topic, workspace_id, db),
+        topic,
+        "Create a mind map with 10-15 nodes based on the context to visualize the "
+        "relationships between key concepts. Return a list of nodes and edges. "
+        "Generate mind map:",
     )
 
-    chain = prompt | structured_llm
-    return chain.invoke({"context": context, "topic": topic})
+
+def generate_study_pack(topic: str, workspace_id: int, db: Session) -> StudyPack:
+    """
+    Lesson plan, flashcards, quiz and mind map from a single LLM call, so the
+    shared context is only sent (and prefilled) once.
+    """
+    context = "\n".join(_retrieve_context_pool(topic, workspace_id, db))
+    return _generate(
+        db,
+        workspace_id,
+        StudyPack,
+        context,
+        topic,
+        "Create a complete study pack based strictly on the provided context:\n"
+        "- lesson: a comprehensive lesson plan.\n"
+        "- flashcards: a set of 5-10 flashcards (Front/Back) covering the key "
+        "concepts, without duplicates.\n"
+        "- quiz: a 5-question multiple choice quiz with diverse questions.\n"
+        "- mind_map: a mind map with 10-15 nodes and the edges relating them.\n"
+        "Generate study pack:",
+    )
@@ -1,19 +1,40 @@
+import asyncio
+import copy
+import io
+import os
 from pathlib import Path
-from typing import List, Iterable
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, BinaryIO, Dict, List, Iterable, Iterator, Optional, Set, Tuple
 import shutil
+import struct
 import uuid
 
+import fitz
+import numpy as np
+import orjson
 from fastapi import UploadFile
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 
 from langchain_text_splitters import (
     MarkdownHeaderTextSplitter,
     MarkdownTextSplitter,
+    TextSplitter,
 )
 from langchain_core.documents import Document as LCDocument
+from langchain_core.embeddings import Embeddings
 
 from backend.models import Document, DocumentChunk
-from backend.services.embeddings import get_embeddings_model
+from backend.services.embeddings import (
+    embed_texts,
+    get_embeddings_model,
+    is_local_embeddings,
+    local_tokenizer,
+)
 
 
 # ======================================================
@@ -22,10 +43,80 @@ from backend.services.embeddings import get_embeddings_model
 
 UPLOAD_DIR = Path("storage/documents")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+UPLOAD_COPY_BUFFER = 1 << 20
 
 CHUNK_SIZE = 700
 CHUNK_OVERLAP = 120
-EMBED_BATCH_SIZE = 64
+# Token budget per chunk for local models (capped at the model's max length)
+CHUNK_TOKENS = 200
+CHUNK_OVERLAP_TOKENS = 20
+# Texts per embedding API request; windows already span page boundaries
+EMBED_BATCH_SIZE = 128
+# Chunks per embedding call when pages are pipelined (local / API models),
+# and windows split ahead of the one being embedded
+EMBED_WINDOW_SIZE = 256
+API_EMBED_WINDOW_SIZE = 2048
+WINDOW_PREFETCH = 1
+INSERT_BATCH_SIZE = 1000
+# Chunks shorter than this, or with less body text than MIN_BODY_CHARS once
+# heading lines are removed, are folded into a neighbour instead of embedded
+MIN_CHUNK_CHARS = 80
+MIN_BODY_CHARS = 40
+
+# Exhaustive list of educational/scientific structural labels
+_MARKER_LABELS = "Chapter|Unit|Module|Lesson|Syllabus|Preface|Introduction|Abstract|Learning Objective|Objective|Section|Part|Phase|Stage|Step|Procedure|Tutorial|Methodology|Example|Case Study|Figure|Table|Equation|Formula|Theorem|Lemma|Definition|Corollary|Postulate|Axiom|Conjecture|Proposition|Proof|Solution|Exercise|Activity|Problem Set|Assignment|Review|Summary|Key Concept|Key Takeaway|Takeaway|Caution|Warning|Tip|Notation|Convention|Observation|Fact|Claim|Hypothesis|Assumption|Protocol|Scheme|Algorithm|Law|Rule|Principle|Property|Framework|Model|Question|Answer|Q&A|Discussion Questions|Discussion|Self-Check|Further Reading|Reference|Quote|Checklist|Conclusion|Result|Analysis|Metric"
+# Structural marker promotion as one multiline pattern: bold headers,
+# structural labels and math environments, tried in that priority order on
+# each whitespace-trimmed line
+_STRUCTURE_RE = re.compile(
+    r"^[^\S\n]*(?:(?P<bold>\*\*[^*\n]+\*\*)"
+    rf"|(?P<marker>(?:{_MARKER_LABELS})[^\S\n]+[^\n]*\S)"
+    r"|(?P<math>\[[^\n]*\]|\$\$[^\n]*\$\$))[^\S\n]*$",
+    re.M | re.I,
+)
+
+try:
+    import hyperscan
+except ImportError:  # optional accelerator, see _marker_candidate_lines
+    hyperscan = None  # type: ignore[assignment]
+
+
+def _build_marker_scanner():
+    """
+    Compile a Hyperscan database whose patterns are loose supersets of the three
+    _STRUCTURE_RE alternatives, so a whole page can be scanned in a single DFA
+    pass.
+    """
+    if hyperscan is None:
+        return None
+    base = hyperscan.HS_FLAG_MULTILINE | hyperscan.HS_FLAG_SOM_LEFTMOST
+    base |= hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP
+    db = hyperscan.Database()
+    db.compile(
+        expressions=[
+            rb"^[^\S\n]*\*\*",
+            f"^[^\\S\\n]*(?:{_MARKER_LABELS})\\s".encode(),
+            rb"^[^\S\n]*(?:\[|\$\$)",
+        ],
+        ids=[0, 1, 2],
+        elements=3,
+        flags=[base, base | hyperscan.HS_FLAG_CASELESS, base],
+    )
+    return db
+
+
+_MARKER_SCANNER = _build_marker_scanner()
+
+# Hyperscan scratch space must not be shared by concurrent scans, and pages are
+# split on a producer thread per ingest, so each thread gets its own.
+_scanner_local = threading.local()
+
+
+def _marker_scratch():
+    scratch = getattr(_scanner_local, "scratch", None)
+    if scratch is None:
+        scratch = _scanner_local.scratch = hyperscan.Scratch(_MARKER_SCANNER)
+    return scratch
 
 
 # ======================================================
@@ -38,7 +129,7 @@ async def ingest_file(file: UploadFile, workspace_id: int, db: Session):
     Entry point for all multimodal uploads.
     Saves the file and triggers the background processing task.
     """
-    file_path = save_file(file)
+    file_path = await save_file(file)
     filename = file.filename or "uploaded_file"
     file_type = infer_file_type_from_filename(filename)
     if file_type == "unknown":
@@ -66,16 +157,23 @@ async def ingest_file(file: UploadFile, workspace_id: int, db: Session):
 # ======================================================
 
 
-def save_file(file: UploadFile) -> Path:
+def _copy_upload(source: BinaryIO, path: Path) -> None:
+    with path.open("wb") as buffer:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(buffer.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        shutil.copyfileobj(source, buffer, UPLOAD_COPY_BUFFER)
+
+
+async def save_file(file: UploadFile) -> Path:
     """
-    Save safely with UUID to avoid collisions, preserving original extension
+    Save safely with UUID to avoid collisions, preserving original extension.
+    The copy runs in a worker thread so large uploads don't block the event loop.
     """
     original_suffix = Path(file.filename or "").suffix
     filename = f"{uuid.uuid4()}{original_suffix}"
     path = UPLOAD_DIR / filename
 
-    with path.open("wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    await asyncio.to_thread(_copy_upload, file.file, path)
 
     return path
 
@@ -141,57 +239,56 @@ def embed_and_store_pages(
     if not doc:
         return 0
 
-    model, dim, _, _ = get_embeddings_model(db, doc.workspace_id)
+    model, dim, provider, model_name = get_embeddings_model(db, doc.workspace_id)
 
-    all_rows: List[DocumentChunk] = []
+    all_rows: List[dict] = []
     chunk_index = 0
 
-    for page_data in pages:
-        page_text = page_data["text"]
-        page_num = page_data["metadata"].get("page", 0) + 1
-
-        refined = promote_structural_markers(page_text)
-
-        chunks = chunk_markdown(refined)
-
-        # Process page chunks in batches for the embedding model
-        for _, batch in batch_iter(chunks, EMBED_BATCH_SIZE):
-            texts = [c.page_content for c in batch]
-            vectors = model.embed_documents(texts)
-
-            for i, (chunk, vector) in enumerate(zip(batch, vectors)):
-                meta = chunk.metadata.copy()
-                meta["page"] = page_num
-
-                prefix = extract_context_prefix(meta)
-                enriched_content = f"{prefix}\n\n{chunk.page_content}"
-
-                chunk_args = {
-                    "document_id": document_id,
-                    "workspace_id": doc.workspace_id,
-                    "content": enriched_content,
-                    "chunk_index": chunk_index,
-                    "chunk_metadata": meta,
-                }
-
-                # Assign to correct embedding column
-                if dim == 1536:
-                    chunk_args["embedding_1536"] = vector
-                elif dim == 1024:
-                    chunk_args["embedding_1024"] = vector
-                elif dim == 768:
-                    chunk_args["embedding_768"] = vector
-                elif dim == 384:
-                    chunk_args["embedding_384"] = vector
-                else:
-                    # Generic fallback if we add more
-                    chunk_args["embedding_768"] = vector
-
-                all_rows.append(DocumentChunk(**chunk_args))
-                chunk_index += 1
-
-    # ⭐ SINGLE BULK INSERT
-    db.add_all(all_rows)
+    # Columns shared by every row, read once: the per-window commits expire
+    # doc, so attribute access in the loop would reload it
+    base_row = {
+        "document_id": document_id,
+        "workspace_id": doc.workspace_id,
+        "embedding_dim": dim,
+    }
+
+    page_texts = (
+        (page_data["metadata"].get("page", 0) + 1, page_data["text"])
+        for page_data in pages
+    )
+
+    # Chunks under the same headers on the same page share one metadata dict
+    # and prefix; rows only reference it, it is serialized on insert.
+    groups: Dict[tuple, Tuple[dict, str]] = {}
+
+    for page_num, chunk, vector in embed_pages(
+        model, page_texts, cache_key=f"{provider}/{model_name}", db=db
+    ):
+        group_key = (tuple(chunk.metadata.items()), page_num)
+        group = groups.get(group_key)
+        if group is None:
+            meta = {**chunk.metadata, "page": page_num}
+            group = groups[group_key] = (meta, extract_context_prefix(meta))
+        meta, prefix = group
+        enriched_content = f"{prefix}\n\n{chunk.page_content}"
+
+        chunk_args = {
+            **base_row,
+            "content": enriched_content,
+            "chunk_index": chunk_index,
+            "chunk_metadata": meta,
+            "embedding": vector,
+        }
+
+        all_rows.append(chunk_args)
+        chunk_index += 1
+
+        # ⭐ BULK INSERT (Core, no ORM unit of work), committed per window
+        if len(all_rows) >= INSERT_BATCH_SIZE:
+            flush_chunk_rows(db, doc, all_rows, page_progress(page_num, len(pages)))
+
+    insert_chunk_rows(db, all_rows)
+    doc.progress = 100
     db.commit()
 
     return chunk_index
@@ -202,20 +299,52 @@ def embed_and_store_pages(
 # ======================================================
 
 
-def chunk_markdown(md_text: str) -> List[LCDocument]:
-    header_splitter = MarkdownHeaderTextSplitter(
-        headers_to_split_on=[("#", f"Header {i}") for i in range(1, 7)],
-        strip_headers=False,
-    )
+# Metadata keys the header splitter stores H1..H6 under
+_HEADER_KEYS = tuple(f"Header {i}" for i in range(1, 7))
+
+# Splitters are built once and shared; splitting keeps no per-call state on them
+_HEADER_SPLITTER = MarkdownHeaderTextSplitter(
+    headers_to_split_on=[("#" * i, key) for i, key in enumerate(_HEADER_KEYS, 1)],
+    strip_headers=False,
+)
+_MD_SPLITTER = MarkdownTextSplitter(
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+)
 
-    header_docs = header_splitter.split_text(md_text)
 
-    splitter = MarkdownTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
+def _token_splitter(tokenizer: Any, max_tokens: int) -> TextSplitter:
+    # The splitter runs on embed_pages' producer thread while the model encodes
+    # on another. tokenize() and encode() toggle truncation/padding on the
+    # shared Rust tokenizer ("Already borrowed" errors, truncated lengths), so
+    # each splitter measures with its own copy.
+    return MarkdownTextSplitter.from_huggingface_tokenizer(
+        copy.deepcopy(tokenizer),
+        chunk_size=min(CHUNK_TOKENS, max_tokens),
+        chunk_overlap=CHUNK_OVERLAP_TOKENS,
     )
 
-    return splitter.split_documents(header_docs)
+
+def text_splitter_for(model: Embeddings) -> TextSplitter:
+    """
+    Local models get chunks measured in their own tokens, so chunks fill the
+    budget the model actually sees instead of being truncated or undersized.
+    API models keep the character-based splitter. Build one per document: a
+    token splitter must not be shared between threads.
+    """
+    tokenizer = local_tokenizer(model)
+    if tokenizer is None:
+        return _MD_SPLITTER
+    try:
+        return _token_splitter(*tokenizer)
+    except ValueError:  # not a transformers tokenizer
+        return _MD_SPLITTER
+
+
+def chunk_markdown(
+    md_text: str, splitter: TextSplitter = _MD_SPLITTER
+) -> List[LCDocument]:
+    return splitter.split_documents(_HEADER_SPLITTER.split_text(md_text))
 
 
 # ======================================================
@@ -223,58 +352,305 @@ def chunk_markdown(md_text: str) -> List[LCDocument]:
 # ======================================================
 
 
+def _is_stub(chunk: LCDocument) -> bool:
+    content = chunk.page_content.strip()
+    if len(content) < MIN_CHUNK_CHARS:
+        return True
+    body = "".join(
+        line for line in content.splitlines() if not line.lstrip().startswith("#")
+    )
+    return len(body.strip()) < MIN_BODY_CHARS
+
+
+def merge_stub_chunks(chunks: List[LCDocument]) -> List[LCDocument]:
+    """
+    Fold heading-only and tiny chunks into the following chunk (or the previous
+    one at the end of a page) so they are not embedded on their own.
+    A page that is nothing but stubs (a short slide, a caption) becomes a
+    single chunk.
+    """
+    merged: List[LCDocument] = []
+    pending = ""
+    for chunk in chunks:
+        if _is_stub(chunk):
+            pending += chunk.page_content.strip() + "\n\n"
+            continue
+        if pending:
+            chunk.page_content = pending + chunk.page_content
+            pending = ""
+        merged.append(chunk)
+    if pending:
+        if merged:
+            merged[-1].page_content += "\n\n" + pending.rstrip()
+        else:
+            chunks[0].page_content = pending.rstrip()
+            merged.append(chunks[0])
+    return merged
+
+
+def split_page(text: str, splitter: TextSplitter = _MD_SPLITTER) -> List[LCDocument]:
+    # Image-only pages come through as empty or whitespace-only text
+    if not text or text.isspace():
+        return []
+    return merge_stub_chunks(chunk_markdown(promote_structural_markers(text), splitter))
+
+
+def _embed_window(
+    model: Embeddings,
+    window: List[Tuple[int, LCDocument]],
+    cache_key: Optional[str],
+    db: Optional[Session],
+) -> Iterator[Tuple[int, LCDocument, np.ndarray]]:
+    vectors = embed_texts(
+        model,
+        [chunk.page_content for _, chunk in window],
+        batch_size=EMBED_BATCH_SIZE,
+        cache_key=cache_key,
+        db=db,
+    )
+    for (page_num, chunk), vector in zip(window, vectors):
+        yield page_num, chunk, vector
+
+
+def embed_pages(
+    model: Embeddings,
+    pages: Iterable[Tuple[int, str]],
+    cache_key: Optional[str] = None,
+    db: Optional[Session] = None,
+) -> Iterator[Tuple[int, LCDocument, np.ndarray]]:
+    """
+    Split (page_num, text) pages into chunks and embed them, yielding
+    (page_num, chunk, vector) in document order.
+
+    A producer thread splits pages into cross-page windows (EMBED_WINDOW_SIZE
+    chunks for local models, API_EMBED_WINDOW_SIZE for API models) while the
+    previous window is embedded; local inference and API calls both release
+    the GIL. Only WINDOW_PREFETCH windows of chunks are held ahead.
+    `cache_key` identifies the model for the embed_texts vector cache; with
+    `db`, vectors are also looked up in and added to the embedding_cache table.
+    """
+    window_size = (
+        EMBED_WINDOW_SIZE if is_local_embeddings(model) else API_EMBED_WINDOW_SIZE
+    )
+    splitter = text_splitter_for(model)
+    windows: queue.Queue = queue.Queue(maxsize=WINDOW_PREFETCH)
+    stop = threading.Event()
+
+    def put(item) -> None:
+        # Give up if the consumer has gone away, instead of blocking forever
+        while not stop.is_set():
+            try:
+                windows.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def produce() -> None:
+        try:
+            window: List[Tuple[int, LCDocument]] = []
+            for page_num, text in pages:
+                window.extend((page_num, chunk) for chunk in split_page(text, splitter))
+                if len(window) >= window_size:
+                    put(window)
+                    window = []
+            if window:
+                put(window)
+        finally:
+            put(None)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        producer = executor.submit(produce)
+        try:
+            while (window := windows.get()) is not None:
+                yield from _embed_window(model, window, cache_key, db)
+            # Surface a failure in the producer
+            producer.result()
+        finally:
+            stop.set()
+
+
 def batch_iter(items: List, size: int) -> Iterable:
     for i in range(0, len(items), size):
         yield i, items[i : i + size]
 
 
-def extract_context_prefix(metadata: dict) -> str:
-    headers = [
-        str(metadata.get(f"Header {i}"))
-        for i in range(1, 7)
-        if metadata.get(f"Header {i}")
-    ]
+# Binary COPY framing (see PostgreSQL "COPY ... FORMAT BINARY")
+_PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+_PGCOPY_TRAILER = struct.pack(">h", -1)
+_PGCOPY_NULL = struct.pack(">i", -1)
+_CHUNK_COPY_COLUMNS = (
+    "document_id",
+    "workspace_id",
+    "content",
+    "chunk_index",
+    "chunk_metadata",
+    "embedding",
+    "embedding_dim",
+)
+_CHUNK_COPY_SQL = (
+    f"COPY {DocumentChunk.__tablename__} ({', '.join(_CHUNK_COPY_COLUMNS)}) "
+    "FROM STDIN (FORMAT BINARY)"
+)
+
 
-    prefix = " > ".join(headers) if headers else "General Content"
+def _copy_field(data: bytes) -> bytes:
+    return struct.pack(">i", len(data)) + data
 
-    if metadata.get("page"):
-        prefix += f" (Page {metadata['page']})"
+
+def _copy_int4(value: Optional[int]) -> bytes:
+    return (
+        _PGCOPY_NULL
+        if value is None
+        else b"\x00\x00\x00\x04" + struct.pack(">i", value)
+    )
+
+
+def encode_chunk_rows(rows: List[dict]) -> bytes:
+    """
+    Encode chunk rows in PostgreSQL binary COPY format. Vectors use pgvector's
+    halfvec binary layout (int16 dim, int16 unused, big-endian float16 values),
+    taken straight from one contiguous numpy array; JSONB is a version byte + JSON.
+    """
+    vectors = np.asarray([row["embedding"] for row in rows], dtype=">f2")
+    vector_header = struct.pack(">HH", vectors.shape[1], 0)
+    field_count = struct.pack(">h", len(_CHUNK_COPY_COLUMNS))
+
+    parts = [_PGCOPY_HEADER]
+    for row, vector in zip(rows, vectors):
+        parts.append(field_count)
+        parts.append(_copy_int4(row["document_id"]))
+        parts.append(_copy_int4(row["workspace_id"]))
+        parts.append(_copy_field(row["content"].encode("utf-8")))
+        parts.append(_copy_int4(row["chunk_index"]))
+        parts.append(
+            _copy_field(
+                b"\x01"
+                + orjson.dumps(row["chunk_metadata"], option=orjson.OPT_NON_STR_KEYS)
+            )
+        )
+        parts.append(_copy_field(vector_header + vector.tobytes()))
+        parts.append(_copy_field(struct.pack(">h", row["embedding_dim"])))
+    parts.append(_PGCOPY_TRAILER)
+    return b"".join(parts)
+
+
+def insert_chunk_rows(db: Session, rows: List[dict]) -> None:
+    """
+    Stream DocumentChunk rows (plain dicts) into Postgres with binary COPY on the
+    session's own connection, so they commit with the surrounding transaction.
+    Drivers without psycopg2's copy_expert get one Core executemany INSERT.
+    """
+    if not rows:
+        return
+    # Raw psycopg2 connection behind the session's current transaction
+    connection: Any = db.connection().connection.dbapi_connection
+    with connection.cursor() as cursor:
+        if not hasattr(cursor, "copy_expert"):
+            # Batched by the engine's insertmanyvalues page size
+            db.execute(insert(DocumentChunk), rows)
+            return
+        for _, window in batch_iter(rows, INSERT_BATCH_SIZE):
+            cursor.copy_expert(_CHUNK_COPY_SQL, io.BytesIO(encode_chunk_rows(window)))
+
+
+def flush_chunk_rows(db: Session, doc: Document, rows: List[dict], progress: int):
+    """
+    Insert and commit buffered chunk rows, record progress, and empty the buffer
+    so memory and transaction size stay bounded for large documents.
+    """
+    insert_chunk_rows(db, rows)
+    doc.progress = progress
+    db.commit()
+    rows.clear()
+
+
+def page_progress(page_num: int, total_pages: int) -> int:
+    # Reserve 100 for when the document is marked completed
+    return min(99, page_num * 100 // max(total_pages, 1))
+
+
+@lru_cache(maxsize=1024)
+def format_context_prefix(
+    headers: Tuple[str, ...], page: Optional[int], fallback: str = "General Content"
+) -> str:
+    """
+    "Context: H1 > H2 (Page n)" line prepended to stored chunks. Memoized, as
+    the same section headers recur on every page they span.
+    """
+    prefix = " > ".join(headers) if headers else fallback
+
+    if page is not None:
+        prefix += f" (Page {page})"
 
     return f"Context: {prefix}"
 
 
-def promote_structural_markers(text: str) -> str:
+def header_values(metadata: dict) -> Tuple[str, ...]:
+    values = []
+    for key in _HEADER_KEYS:
+        value = metadata.get(key)
+        if value:
+            values.append(str(value))
+    return tuple(values)
+
+
+def extract_context_prefix(metadata: dict) -> str:
+    return format_context_prefix(header_values(metadata), metadata.get("page") or None)
+
+
+def _marker_candidate_lines(text: str) -> List[int]:
     """
-    Fast regex-based structural marker promotion.
-    NO LLM usage here.
+    Indexes of lines that may hold a structural marker, found with a single
+    Hyperscan pass over the whole page.
     """
-    import re
+    haystack = text.encode("utf-8")
+    found: Set[int] = set()
 
-    lines = text.split("\n")
-    new_lines = []
+    def on_match(_id, start, _end, _flags, _context):
+        found.add(start)
+
+    _MARKER_SCANNER.scan(
+        haystack, match_event_handler=on_match, scratch=_marker_scratch()
+    )
 
-    # Exhaustive list of educational/scientific structural labels
-    marker_pattern = r"^(Chapter|Unit|Module|Lesson|Syllabus|Preface|Introduction|Abstract|Learning Objective|Objective|Section|Part|Phase|Stage|Step|Procedure|Tutorial|Methodology|Example|Case Study|Figure|Table|Equation|Formula|Theorem|Lemma|Definition|Corollary|Postulate|Axiom|Conjecture|Proposition|Proof|Solution|Exercise|Activity|Problem Set|Assignment|Review|Summary|Key Concept|Key Takeaway|Takeaway|Caution|Warning|Tip|Notation|Convention|Observation|Fact|Claim|Hypothesis|Assumption|Protocol|Scheme|Algorithm|Law|Rule|Principle|Property|Framework|Model|Question|Answer|Q&A|Discussion Questions|Discussion|Self-Check|Further Reading|Reference|Quote|Checklist|Conclusion|Result|Analysis|Metric)\s+\d*[:.]?"
+    line_numbers = []
+    line, last = 0, 0
+    for start in sorted(found):
+        line += haystack.count(b"\n", last, start)
+        last = start
+        line_numbers.append(line)
+    return line_numbers
 
-    for line in lines:
-        stripped = line.strip()
 
-        # 1. Bold headers promotion
-        if re.match(r"^\*\*[^*]+\*\*$", stripped) and not stripped.startswith("#"):
-            new_lines.append(f"#### {stripped.replace('**', '')}")
+def _promote(match: re.Match) -> str:
+    kind = match.lastgroup
 
-        # 2. Structural marker promotion
-        elif re.match(marker_pattern, stripped, re.I) and not stripped.startswith("#"):
-            new_lines.append(f"##### {stripped}")
+    # 1. Bold headers promotion
+    if kind == "bold":
+        return f"#### {match['bold'].replace('**', '')}"
 
-        # 3. Math environments
-        elif re.match(r"^\[.*\]$|^\$\$.*\$\$$", stripped):
-            new_lines.append("###### Equation Block")
-            new_lines.append(line)
-        else:
-            new_lines.append(line)
+    # 2. Structural marker promotion
+    if kind == "marker":
+        return f"##### {match['marker']}"
+
+    # 3. Math environments
+    return f"###### Equation Block\n{match[0]}"
+
+
+def promote_structural_markers(text: str) -> str:
+    """
+    Fast regex-based structural marker promotion.
+    NO LLM usage here.
+    A single re.sub sweep over the page; with Hyperscan installed only the
+    candidate lines it finds are matched.
+    """
+    if _MARKER_SCANNER is None:
+        return _STRUCTURE_RE.sub(_promote, text)
 
-    return "\n".join(new_lines)
+    lines = text.split("\n")
+    for i in _marker_candidate_lines(text):
+        lines[i] = _STRUCTURE_RE.sub(_promote, lines[i])
+    return "\n".join(lines)
 
 
 # ======================================================
@@ -282,11 +658,20 @@ def promote_structural_markers(text: str) -> str:
 # ======================================================
 
 
-def extract_pdf_toc(path: Path) -> List[dict]:
-    import fitz
+def extract_pdf_toc_from_doc(doc: "fitz.Document") -> List[dict]:
+    """
+    Outline of an already-open PDF, so callers that also extract text parse the
+    file only once.
+    """
+    return [
+        {"level": lvl, "title": title, "page": page}
+        for lvl, title, page in doc.get_toc()
+    ]
 
-    doc = fitz.open(str(path))
-    toc = doc.get_toc()
-    doc.close()
 
-    return [{"level": lvl, "title": title, "page": page} for lvl, title, page in toc]
+def extract_pdf_toc(path: Path) -> List[dict]:
+    doc = fitz.open(str(path))
+    try:
+        return extract_pdf_toc_from_doc(doc)
+    finally:
+        doc.close()
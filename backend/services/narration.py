@@ -1,5 +1,6 @@
 import os
 import io
+import threading
 from pathlib import Path
 from kokoro_onnx import Kokoro
 import soundfile as sf
@@ -14,45 +15,61 @@ MODEL_PATH = os.getenv("KOKORO_MODEL_PATH", str(_DEFAULT_MODEL))
 VOICES_PATH = os.getenv("KOKORO_VOICES_PATH", str(_DEFAULT_VOICES))
 
 _kokoro = None
+_thread_kokoro = threading.local()
+
+
+def _load_kokoro() -> Kokoro:
+    missing = []
+    if not os.path.exists(MODEL_PATH):
+        missing.append(MODEL_PATH)
+    if not os.path.exists(VOICES_PATH):
+        missing.append(VOICES_PATH)
+    if missing:
+        raise FileNotFoundError(
+            "Kokoro model files are missing:\n"
+            + "\n".join(f"- {p}" for p in missing)
+            + "\n\nExpected directory:\n"
+            + str(Path(MODEL_PATH).parent)
+        )
+    try:
+        return Kokoro(MODEL_PATH, VOICES_PATH)
+    except Exception as e:
+        # Common cause: corrupted / truncated ONNX download (InvalidProtobuf)
+        def _size(p: str) -> str:
+            try:
+                return f"{os.path.getsize(p) / 1024 / 1024:.1f} MB"
+            except Exception:
+                return "unknown size"
+
+        raise RuntimeError(
+            "Failed to initialize Kokoro ONNX runtime.\n"
+            f"- model: {MODEL_PATH} ({_size(MODEL_PATH)})\n"
+            f"- voices: {VOICES_PATH} ({_size(VOICES_PATH)})\n\n"
+            "This usually means the ONNX file is corrupted/truncated or not the expected model version.\n"
+            "Fix: re-download the model/voices from a trusted source (e.g. Hugging Face onnx-community Kokoro ONNX),\n"
+            "or set env vars KOKORO_MODEL_PATH and KOKORO_VOICES_PATH to point to valid files.\n\n"
+            f"Underlying error: {e}"
+        ) from e
 
 
 def get_kokoro():
     global _kokoro
     if _kokoro is None:
-        missing = []
-        if not os.path.exists(MODEL_PATH):
-            missing.append(MODEL_PATH)
-        if not os.path.exists(VOICES_PATH):
-            missing.append(VOICES_PATH)
-        if missing:
-            raise FileNotFoundError(
-                "Kokoro model files are missing:\n"
-                + "\n".join(f"- {p}" for p in missing)
-                + "\n\nExpected directory:\n"
-                + str(Path(MODEL_PATH).parent)
-            )
-        try:
-            _kokoro = Kokoro(MODEL_PATH, VOICES_PATH)
-        except Exception as e:
-            # Common cause: corrupted / truncated ONNX download (InvalidProtobuf)
-            def _size(p: str) -> str:
-                try:
-                    return f"{os.path.getsize(p) / 1024 / 1024:.1f} MB"
-                except Exception:
-                    return "unknown size"
-
-            raise RuntimeError(
-                "Failed to initialize Kokoro ONNX runtime.\n"
-                f"- model: {MODEL_PATH} ({_size(MODEL_PATH)})\n"
-                f"- voices: {VOICES_PATH} ({_size(VOICES_PATH)})\n\n"
-                "This usually means the ONNX file is corrupted/truncated or not the expected model version.\n"
-                "Fix: re-download the model/voices from a trusted source (e.g. Hugging Face onnx-community Kokoro ONNX),\n"
-                "or set env vars KOKORO_MODEL_PATH and KOKORO_VOICES_PATH to point to valid files.\n\n"
-                f"Underlying error: {e}"
-            ) from e
+        _kokoro = _load_kokoro()
     return _kokoro
 
 
+def get_thread_kokoro() -> Kokoro:
+    """
+    A Kokoro instance owned by the calling thread, for parallel synthesis
+    (each has its own ONNX session and phonemizer state).
+    """
+    kokoro = getattr(_thread_kokoro, "instance", None)
+    if kokoro is None:
+        kokoro = _thread_kokoro.instance = _load_kokoro()
+    return kokoro
+
+
 def generate_speech(text: str, voice: str = "af_bella") -> io.BytesIO:
     """
     Generates speech from text and returns a BytesIO object containing the WAV data.
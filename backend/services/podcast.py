@@ -1,10 +1,11 @@
 import os
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy.orm import Session
 import numpy as np
 import soundfile as sf
 from backend.services.rag import get_relevant_context
-from backend.services.narration import get_kokoro
+from backend.services.narration import get_thread_kokoro
 from backend.schemas import Podcast
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser
@@ -17,6 +18,14 @@ logger = logging.getLogger(__name__)
 PODCAST_STORAGE_DIR = "storage/audio/podcasts"
 os.makedirs(PODCAST_STORAGE_DIR, exist_ok=True)
 
+# Script lines synthesized in parallel; each worker thread keeps its own Kokoro
+# instance, so every extra worker costs one more loaded model.
+# Override with env var: KOKORO_TTS_WORKERS=<n>
+TTS_WORKERS = int(os.getenv("KOKORO_TTS_WORKERS") or 2)
+_tts_executor = ThreadPoolExecutor(
+    max_workers=TTS_WORKERS, thread_name_prefix="kokoro-tts"
+)
+
 # In-memory progress cache: {podcast_id: {"progress": 0-100, "status": "synthesizing"|"complete"|"failed", "message": ""}}
 synthesis_progress_cache = {}
 
@@ -103,6 +112,13 @@ def generate_podcast_script(
     return result
 
 
+def _synthesize_line(item):
+    # Note: speed=1.1 or 1.2 often sounds more natural for conversation
+    return get_thread_kokoro().create(
+        item.text, voice=item.voice, speed=1.1, lang="en-us"
+    )
+
+
 def synthesize_podcast_audio(podcast: Podcast, podcast_id: Optional[int] = None) -> str:
     """
     Synthesizes the entire podcast script into a single WAV file.
@@ -117,33 +133,30 @@ def synthesize_podcast_audio(podcast: Podcast, podcast_id: Optional[int] = None)
             "message": "Starting synthesis...",
         }
 
+    futures = []
     try:
-        kokoro = get_kokoro()
-        all_audio = []
+        segments = []
         sample_rate = 24000  # Kokoro default
         total_items = len(podcast.script)
 
-        for idx, item in enumerate(podcast.script):
+        futures = [
+            _tts_executor.submit(_synthesize_line, item) for item in podcast.script
+        ]
+        for idx, future in enumerate(futures):
+            samples, sr = future.result()
+            sample_rate = sr
+            segments.append(samples)
+
             # Update progress
             if podcast_id:
-                progress = int((idx / total_items) * 90)  # Reserve 10% for file saving
+                # Reserve 10% for file saving
+                progress = int(((idx + 1) / total_items) * 90)
                 synthesis_progress_cache[podcast_id] = {
                     "progress": progress,
                     "status": "synthesizing",
-                    "message": f"Synthesizing dialogue {idx + 1}/{total_items}...",
+                    "message": f"Synthesized dialogue {idx + 1}/{total_items}...",
                 }
 
-            # Generate samples for this line
-            # Note: speed=1.1 or 1.2 often sounds more natural for conversation
-            samples, sr = kokoro.create(
-                item.text, voice=item.voice, speed=1.1, lang="en-us"
-            )
-            sample_rate = sr
-            # Add a small silence (0.5s) between speakers
-            silence = np.zeros(int(sample_rate * 0.5))
-            all_audio.append(samples)
-            all_audio.append(silence)
-
         # Update progress for file saving
         if podcast_id:
             synthesis_progress_cache[podcast_id] = {
@@ -152,8 +165,17 @@ def synthesize_podcast_audio(podcast: Podcast, podcast_id: Optional[int] = None)
                 "message": "Saving audio file...",
             }
 
-        # Concatenate all parts
-        final_audio = np.concatenate(all_audio)
+        # Write every line into one preallocated buffer, followed by a small
+        # silence (0.5s) between speakers; np.zeros leaves the gaps silent
+        gap = int(sample_rate * 0.5)
+        final_audio = np.zeros(
+            sum(len(samples) for samples in segments) + gap * len(segments),
+            dtype=np.float32,
+        )
+        offset = 0
+        for samples in segments:
+            final_audio[offset : offset + len(samples)] = samples
+            offset += len(samples) + gap
 
         # Save to disk
         filename = f"podcast_{uuid.uuid4().hex}.wav"
@@ -172,6 +194,8 @@ def synthesize_podcast_audio(podcast: Podcast, podcast_id: Optional[int] = None)
         return f"audio/podcasts/{filename}"
 
     except Exception as e:
+        for future in futures:
+            future.cancel()
         logger.exception("Podcast synthesis failed")
         if podcast_id:
             synthesis_progress_cache[podcast_id] = {
@@ -0,0 +1,267 @@
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from cachetools import LRUCache
+from pgvector.sqlalchemy import HALFVEC
+from sqlalchemy import cast as sql_cast
+from sqlalchemy import Integer, RowMapping, column, select, text, true, values
+from sqlalchemy.orm import aliased
+from sqlalchemy.orm import Session
+
+from backend.models import EMBEDDING_DIMS, DocumentChunk
+from backend.services.embeddings import (
+    embed_query,
+    get_embeddings_model,
+    l2_normalize,
+)
+from backend.services.vector_cache import top_k_ids, top_k_ids_batch
+
+logger = logging.getLogger(__name__)
+
+# HNSW search breadth (hnsw.ef_search, raised to k when k is larger); higher
+# values trade latency for recall. Override with env var: RAG_HNSW_EF_SEARCH=<n>
+HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH") or 40)
+
+
+# Log the candidate query plan (EXPLAIN ANALYZE) on every search; for checking
+# that the HNSW index is used. Enable with env var: RAG_EXPLAIN_SEARCH=1
+EXPLAIN_SEARCH = os.getenv("RAG_EXPLAIN_SEARCH") == "1"
+
+# Recently returned chunk rows (content and metadata), keyed by id. Chunk rows are
+# never updated and ids are never reused, so entries cannot go stale.
+# Override with env var: RAG_CHUNK_CACHE_SIZE=<entries>
+CHUNK_CACHE_SIZE = int(os.getenv("RAG_CHUNK_CACHE_SIZE") or 10000)
+
+_chunk_cache: LRUCache = LRUCache(maxsize=max(CHUNK_CACHE_SIZE, 1))
+_chunk_cache_lock = threading.Lock()
+
+# Columns of the chunk rows search returns; the embedding is never needed
+_CHUNK_COLUMNS = (
+    DocumentChunk.id,
+    DocumentChunk.document_id,
+    DocumentChunk.workspace_id,
+    DocumentChunk.content,
+    DocumentChunk.chunk_index,
+    DocumentChunk.chunk_metadata,
+)
+
+# pgvector >= 0.8 can keep walking the HNSW graph until enough rows pass the
+# workspace filter; resolved once per process.
+_iterative_scan: Optional[bool] = None
+
+
+def _supports_iterative_scan(db: Session) -> bool:
+    global _iterative_scan
+    if _iterative_scan is None:
+        version = db.execute(
+            text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+        ).scalar()
+        major, minor = (int(part) for part in (version or "0.0").split(".")[:2])
+        _iterative_scan = (major, minor) >= (0, 8)
+    return _iterative_scan
+
+
+def _explain(db: Session, stmt) -> str:
+    dialect = db.get_bind().dialect
+    compiled = stmt.compile(dialect=dialect)
+    params = {}
+    for key, value in compiled.params.items():
+        processor = compiled.binds[key].type.bind_processor(dialect)
+        params[key] = processor(value) if processor else value
+    plan = db.connection().exec_driver_sql(f"EXPLAIN ANALYZE {compiled}", params)
+    return "\n".join(row[0] for row in plan)
+
+
+def _check_dim(dim: int) -> None:
+    # Fail before any query: an unindexed dimension would fall back to a
+    # sequential scan over every workspace's chunks
+    if dim not in EMBEDDING_DIMS:
+        raise ValueError(
+            f"Unsupported embedding dim {dim}. "
+            f"Supported dimensions are: {', '.join(map(str, EMBEDDING_DIMS))}."
+        )
+
+
+def _configure_index_scan(db: Session, n: int) -> None:
+    # ef_search bounds how many rows the index can return
+    db.execute(text(f"SET LOCAL hnsw.ef_search = {max(HNSW_EF_SEARCH, n)}"))
+    if _supports_iterative_scan(db):
+        # Without it, a small workspace in a large table can come back with
+        # fewer than n rows once other workspaces' neighbours are filtered out
+        db.execute(text("SET LOCAL hnsw.iterative_scan = relaxed_order"))
+
+
+def _index_candidates(
+    db: Session, workspace_id: int, dim: int, query_vector: np.ndarray, n: int
+):
+    """
+    Ids of the n nearest chunks according to the HNSW index.
+    """
+    # Walks the dimension's partial halfvec HNSW index (the cast and the
+    # embedding_dim filter must match its definition)
+    _configure_index_scan(db, n)
+    candidates = (
+        select(DocumentChunk.id)
+        .filter(DocumentChunk.workspace_id == workspace_id)  # type: ignore
+        .filter(DocumentChunk.embedding_dim == dim)
+        .order_by(
+            sql_cast(DocumentChunk.embedding, HALFVEC(dim)).max_inner_product(
+                query_vector
+            )
+        )
+        .limit(n)
+    )
+    if EXPLAIN_SEARCH:
+        logger.info(f"Candidate search plan:\n{_explain(db, candidates)}")
+    return candidates.scalar_subquery()
+
+
+def _candidate_filter(
+    db: Session,
+    workspace_id: int,
+    dim: int,
+    query_vector: np.ndarray,
+    k: int,
+):
+    """
+    WHERE clause restricting chunks to the k nearest ones: exact from the
+    in-memory matrix for small workspaces, otherwise from the HNSW index.
+    """
+    ids = top_k_ids(db, workspace_id, dim, query_vector, k)
+    if ids is not None:
+        return DocumentChunk.id.in_(ids)
+    return DocumentChunk.id.in_(
+        _index_candidates(db, workspace_id, dim, query_vector, k)
+    )
+
+
+def _load_chunks(db: Session, ids: List[int]) -> List[RowMapping]:
+    """
+    Chunk rows for `ids`, in that order, served from the process cache where
+    possible; the misses are fetched in one SELECT. Rows are immutable
+    mappings of _CHUNK_COLUMNS, so no ORM objects are built or tracked.
+    """
+    with _chunk_cache_lock:
+        found: Dict[int, RowMapping] = {
+            chunk_id: _chunk_cache[chunk_id]
+            for chunk_id in ids
+            if chunk_id in _chunk_cache
+        }
+    missing = [chunk_id for chunk_id in ids if chunk_id not in found]
+    if missing:
+        rows = db.execute(
+            select(*_CHUNK_COLUMNS).filter(DocumentChunk.id.in_(missing))
+        ).mappings()
+        loaded = {row["id"]: row for row in rows}
+        if CHUNK_CACHE_SIZE > 0:
+            with _chunk_cache_lock:
+                _chunk_cache.update(loaded)
+        found.update(loaded)
+    return [found[chunk_id] for chunk_id in ids if chunk_id in found]
+
+
+def search_documents_with_scores(
+    query: str, workspace_id: int, db: Session, k: int = 8
+) -> List[Tuple[RowMapping, float]]:
+    """
+    Semantic search using pgvector, filtered by workspace_id.
+    Returns (chunk row, cosine distance) pairs, nearest first; chunk rows are
+    read-only mappings of id, document_id, workspace_id, content, chunk_index
+    and chunk_metadata.
+    """
+    embedding_model, dim, provider, model_name = get_embeddings_model(db, workspace_id)
+    _check_dim(dim)
+    # Stored embeddings are unit length, so inner product ranks like cosine
+    query_vector = embed_query(embedding_model, query, f"{provider}/{model_name}")
+
+    # The index already holds the stored halfvec values, so its top k are final;
+    # this query only scores them. Content comes from the chunk cache.
+    in_pool = _candidate_filter(db, workspace_id, dim, query_vector, k)
+    distance = DocumentChunk.embedding.cosine_distance(query_vector).label("distance")
+    stmt = (
+        select(DocumentChunk.id, distance).filter(in_pool).order_by(distance).limit(k)
+    )
+    ranked = {chunk_id: float(dist) for chunk_id, dist in db.execute(stmt)}
+    chunks = _load_chunks(db, list(ranked))
+    return [(chunk, ranked[chunk["id"]]) for chunk in chunks]
+
+
+def search_documents(
+    query: str, workspace_id: int, db: Session, k: int = 8
+) -> List[RowMapping]:
+    return [
+        chunk for chunk, _ in search_documents_with_scores(query, workspace_id, db, k)
+    ]
+
+
+def _batch_index_search(
+    db: Session,
+    workspace_id: int,
+    dim: int,
+    query_vectors: np.ndarray,
+    k: int,
+) -> List[List[RowMapping]]:
+    # One statement for all queries: a LATERAL join walks the HNSW index once
+    # per query row and keeps its k nearest.
+    _configure_index_scan(db, k)
+    queries = values(
+        column("qid", Integer), column("vec", HALFVEC(dim)), name="q"
+    ).data(list(enumerate(query_vectors)))
+    query_vec = sql_cast(queries.c.vec, HALFVEC(dim))
+
+    candidate = aliased(DocumentChunk)
+    score = sql_cast(candidate.embedding, HALFVEC(dim)).max_inner_product(query_vec)
+    nearest = (
+        select(candidate.id, score.label("score"))
+        .filter(candidate.workspace_id == workspace_id)  # type: ignore
+        .filter(candidate.embedding_dim == dim)
+        .order_by(score)
+        .limit(k)
+        .lateral("nearest")
+    )
+    # Projects the chunk columns only: the embeddings stay in TOAST
+    stmt = (
+        select(queries.c.qid, *_CHUNK_COLUMNS)
+        .select_from(queries)
+        .join(nearest, true())
+        .join(DocumentChunk, DocumentChunk.id == nearest.c.id)
+        .order_by(queries.c.qid, nearest.c.score)
+    )
+    if EXPLAIN_SEARCH:
+        logger.info(f"Batch search plan:\n{_explain(db, stmt)}")
+
+    results: List[List[RowMapping]] = [[] for _ in range(len(query_vectors))]
+    for row in db.execute(stmt).mappings():
+        results[row["qid"]].append(row)
+    return results
+
+
+def search_documents_batch(
+    queries: List[str], workspace_id: int, db: Session, k: int = 8
+) -> List[List[RowMapping]]:
+    """
+    `search_documents` for several queries (multi-query expansion, HyDE) in
+    one embedding call and one SQL round trip.
+    Returns one list of chunks per query, nearest first.
+    """
+    if not queries:
+        return []
+    embedding_model, dim, _, _ = get_embeddings_model(db, workspace_id)
+    _check_dim(dim)
+    query_vectors = l2_normalize(embedding_model.embed_documents(queries))
+
+    ids_per_query = top_k_ids_batch(db, workspace_id, dim, query_vectors, k)
+    if ids_per_query is None:
+        return _batch_index_search(db, workspace_id, dim, query_vectors, k)
+
+    # Small workspace: exact ids from the in-memory matrix, rows from the
+    # chunk cache (misses in one SELECT)
+    wanted = list(dict.fromkeys(chunk_id for ids in ids_per_query for chunk_id in ids))
+    chunks = {chunk["id"]: chunk for chunk in _load_chunks(db, wanted)}
+    return [
+        [chunks[chunk_id] for chunk_id in ids if chunk_id in chunks]
+        for ids in ids_per_query
+    ]
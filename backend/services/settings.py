@@ -1,15 +1,23 @@
+import threading
 from typing import Optional
 
+from cachetools import TTLCache, cached
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from backend.models import AppSettings
+from backend.schemas import AppSettingsSnapshot
 
+# Seconds a settings snapshot is reused. Saving settings clears it in the
+# saving process; other processes (Celery workers) catch up within this window.
+SETTINGS_CACHE_TTL = 30
 
-def get_app_settings(db: Session) -> AppSettings:
+_settings_cache: TTLCache = TTLCache(maxsize=1, ttl=SETTINGS_CACHE_TTL)
+
+
+def _settings_row(db: Session) -> AppSettings:
     """
-    Get the application settings from the database.
-    Creates a default entry if none exists.
+    The settings row attached to `db`, created with defaults if none exists.
     """
     stmt = select(AppSettings).limit(1)
     settings = db.execute(stmt).scalar_one_or_none()
@@ -46,6 +54,17 @@ def get_app_settings(db: Session) -> AppSettings:
     return settings
 
 
+@cached(_settings_cache, key=lambda db: "app_settings", lock=threading.Lock())
+def get_app_settings(db: Session) -> AppSettingsSnapshot:
+    """
+    Get the application settings from the database.
+    Creates a default entry if none exists.
+    Returns a frozen, process-wide snapshot (cached for SETTINGS_CACHE_TTL
+    seconds); change settings through update_app_settings.
+    """
+    return AppSettingsSnapshot.model_validate(_settings_row(db))
+
+
 def update_app_settings(
     db: Session,
     llm_provider: Optional[str] = None,
@@ -61,7 +80,7 @@ def update_app_settings(
     """
     Update the application settings.
     """
-    settings = get_app_settings(db)
+    settings = _settings_row(db)
 
     if llm_provider is not None:
         settings.llm_provider = llm_provider
@@ -85,4 +104,5 @@ def update_app_settings(
 
     db.commit()
     db.refresh(settings)
+    _settings_cache.clear()
     return settings
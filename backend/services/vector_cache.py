@@ -0,0 +1,167 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from backend.models import DocumentChunk
+
+try:
+    import faiss
+except ImportError:  # optional accelerator, see _Entry
+    faiss = None
+
+# Below this many chunks an exact in-process scan beats an HNSW round trip.
+# Override with env var: RAG_NUMPY_SEARCH_MAX_CHUNKS=0 disables the cache.
+NUMPY_SEARCH_MAX_CHUNKS = int(os.getenv("RAG_NUMPY_SEARCH_MAX_CHUNKS") or 10000)
+
+# Memory budget for cached (workspace, dim) matrices; least recently used ones
+# are dropped beyond it. Override with env var: RAG_NUMPY_CACHE_MB=<megabytes>
+MAX_CACHE_BYTES = int(os.getenv("RAG_NUMPY_CACHE_MB") or 256) * 1024 * 1024
+
+
+class _Entry:
+    """
+    Chunk ids and vectors of one (workspace, dim). With faiss installed the
+    vectors are kept as an 8-bit scalar-quantized index (a quarter of the
+    float32 memory, scored with int8 SIMD kernels) instead of a float32 matrix.
+    """
+
+    __slots__ = ("fingerprint", "ids", "matrix", "index")
+
+    def __init__(
+        self, fingerprint: Tuple[int, int], ids: np.ndarray, matrix: np.ndarray
+    ):
+        self.fingerprint = fingerprint
+        self.ids = ids
+        self.matrix: Optional[np.ndarray] = matrix
+        self.index: Any = None
+        if faiss is not None:
+            self.index = faiss.IndexScalarQuantizer(
+                matrix.shape[1],
+                faiss.ScalarQuantizer.QT_8bit,
+                faiss.METRIC_INNER_PRODUCT,
+            )
+            self.index.train(matrix)
+            self.index.add(matrix)
+            self.matrix = None
+
+    @property
+    def nbytes(self) -> int:
+        if self.matrix is not None:
+            return self.ids.nbytes + self.matrix.nbytes
+        return self.ids.nbytes + self.index.sa_code_size() * self.index.ntotal
+
+    def search(self, queries: np.ndarray, k: int) -> List[List[int]]:
+        """
+        Top-k ids per row of a (n_queries, dim) batch of unit-length queries.
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        if self.matrix is None:
+            _, positions = self.index.search(queries, min(k, len(self.ids)))
+            return [self.ids[row[row >= 0]].tolist() for row in positions]
+        return [self._top_k(scores, k) for scores in queries @ self.matrix.T]
+
+    def _top_k(self, scores: np.ndarray, k: int) -> List[int]:
+        if k < len(scores):
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return self.ids[top].tolist()
+
+
+_cache: "OrderedDict[Tuple[int, int], _Entry]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _cache_bytes() -> int:
+    return sum(entry.nbytes for entry in _cache.values())
+
+
+def _load(db: Session, workspace_id: int, dim: int) -> _Entry:
+    rows = db.execute(
+        select(DocumentChunk.id, DocumentChunk.embedding)
+        .where(DocumentChunk.workspace_id == workspace_id)
+        .where(DocumentChunk.embedding_dim == dim)
+        .order_by(DocumentChunk.id)
+    ).all()
+    ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    matrix = np.stack([np.asarray(row[1], dtype=np.float32) for row in rows])
+    return _Entry((len(rows), int(ids[-1])), ids, matrix)
+
+
+def _current_entry(db: Session, workspace_id: int, dim: int) -> Optional[_Entry]:
+    # Chunks are written by the Celery worker, so a cheap (count, max id)
+    # fingerprint detects inserts and deletes made in other processes.
+    # The scan stops after NUMPY_SEARCH_MAX_CHUNKS + 1 ids, so large workspaces
+    # (which use the HNSW index) don't pay a full count on every search; below
+    # the limit the subquery holds every id and max() is exact.
+    sample = (
+        select(DocumentChunk.id)
+        .where(DocumentChunk.workspace_id == workspace_id)
+        .where(DocumentChunk.embedding_dim == dim)
+        .limit(NUMPY_SEARCH_MAX_CHUNKS + 1)
+        .subquery()
+    )
+    count, max_id = db.execute(select(func.count(), func.max(sample.c.id))).one()
+    if not count or count > NUMPY_SEARCH_MAX_CHUNKS:
+        return None
+
+    key = (workspace_id, dim)
+    fingerprint = (count, max_id)
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None and entry.fingerprint == fingerprint:
+            _cache.move_to_end(key)
+        else:
+            entry = None
+
+    if entry is None:
+        entry = _load(db, workspace_id, dim)
+        with _lock:
+            _cache[key] = entry
+            _cache.move_to_end(key)
+            # The entry just added always stays, even if it alone is over budget
+            while len(_cache) > 1 and _cache_bytes() > MAX_CACHE_BYTES:
+                _cache.popitem(last=False)
+    return entry
+
+
+def top_k_ids(
+    db: Session,
+    workspace_id: int,
+    dim: int,
+    query_vector: np.ndarray,
+    k: int,
+) -> Optional[List[int]]:
+    """
+    Top-k chunk ids for a unit-length query using an in-memory matrix product
+    (exact, or over int8-quantized vectors when faiss is installed).
+    Returns None when the workspace is too large (or empty) so the caller can
+    fall back to the pgvector index.
+    """
+    entry = _current_entry(db, workspace_id, dim)
+    if entry is None:
+        return None
+    return entry.search(np.asarray(query_vector)[None, :], k)[0]
+
+
+def top_k_ids_batch(
+    db: Session,
+    workspace_id: int,
+    dim: int,
+    query_vectors: np.ndarray,
+    k: int,
+) -> Optional[List[List[int]]]:
+    """
+    `top_k_ids` for a (n_queries, dim) batch of unit-length queries, scored
+    in one call.
+    """
+    entry = _current_entry(db, workspace_id, dim)
+    if entry is None:
+        return None
+    return entry.search(query_vectors, k)
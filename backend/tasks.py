@@ -1,5 +1,9 @@
+import base64
+import io
+import mimetypes
+import mmap
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Tuple
 from sqlalchemy.orm import Session
 import logging
 from backend.celery_app import celery_app
@@ -7,16 +11,22 @@ from backend.database import SessionLocal
 from backend.models import Document, DocumentChunk, Workspace
 from backend.services.embeddings import get_embeddings_model
 from backend.services.ingestion import (
-    promote_structural_markers,
-    chunk_markdown,
-    batch_iter,
-    EMBED_BATCH_SIZE,
+    INSERT_BATCH_SIZE,
+    embed_pages,
+    extract_pdf_toc_from_doc,
+    flush_chunk_rows,
+    format_context_prefix,
+    header_values,
+    insert_chunk_rows,
+    page_progress,
 )
 
 # Multimodal loaders
+import fitz
 import pymupdf4llm
 from docx import Document as DocxDocument
 from pptx import Presentation
+from PIL import Image
 import openai
 
 # Configure logging
@@ -38,15 +48,16 @@ def process_document_task(document_id: int):
 
     try:
         db_doc.status = "processing"
+        db_doc.progress = 0
         db.commit()
 
         file_path = Path(db_doc.file_path)
         ext = file_path.suffix.lower()
 
-        content_pages = []  # List of {"text": str, "metadata": dict}
+        content_pages: List[dict] = []  # List of {"text": str, "metadata": dict}
 
         if ext == ".pdf":
-            content_pages = pymupdf4llm.to_markdown(str(file_path), page_chunks=True)
+            content_pages, db_doc.toc = _process_pdf(file_path)
             db_doc.file_type = "pdf"
         elif ext in [".docx", ".doc"]:
             content_pages = _process_docx(file_path)
@@ -71,6 +82,12 @@ def process_document_task(document_id: int):
 
     except Exception as e:
         logger.exception(f"Error processing document {document_id}")
+        # Chunks are committed per window; drop the ones already stored so a
+        # failed document never shows up in search
+        db.rollback()
+        db.query(DocumentChunk).filter(
+            DocumentChunk.document_id == document_id
+        ).delete()
         db_doc.status = "failed"
         db_doc.error_message = str(e)
         db.commit()
@@ -78,14 +95,80 @@ def process_document_task(document_id: int):
         db.close()
 
 
+def _process_pdf(path: Path) -> Tuple[List[dict], List[dict]]:
+    """
+    Markdown per page via pymupdf4llm (keeps headings for header-aware chunking),
+    plus the PDF outline, from a single open of the file.
+    PDFs its layout analysis cannot handle fall back to plain text from PDFium,
+    then pypdf.
+    """
+    toc: List[dict] = []
+    try:
+        doc = fitz.open(str(path))
+        try:
+            toc = extract_pdf_toc_from_doc(doc)
+            return pymupdf4llm.to_markdown(doc, page_chunks=True), toc
+        finally:
+            doc.close()
+    except Exception:
+        logger.warning(f"pymupdf4llm failed on {path}; falling back to plain text")
+
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        from pypdf import PdfReader
+
+        reader = PdfReader(str(path))
+        return [
+            {"text": page.extract_text() or "", "metadata": {"page": i + 1}}
+            for i, page in enumerate(reader.pages)
+        ], toc
+
+    # A PdfDocument must not be shared between threads; open one per call
+    pdf = pdfium.PdfDocument(str(path))
+    try:
+        content_pages = []
+        for i in range(len(pdf)):
+            page = pdf[i]
+            textpage = page.get_textpage()
+            content_pages.append(
+                {"text": textpage.get_text_range(), "metadata": {"page": i + 1}}
+            )
+            textpage.close()
+            page.close()
+        return content_pages, toc
+    finally:
+        pdf.close()
+
+
+# Word files only carry page boundaries as of their last save; without those
+# markers, pages are approximated by paragraph runs of about this many chars.
+DOCX_PAGE_CHARS = 4000
+
+# Page boundaries recorded by Word's last layout, or explicit page breaks
+_DOCX_PAGE_BREAK_XPATH = ".//w:lastRenderedPageBreak | .//w:br[@w:type='page']"
+
+
 def _process_docx(path: Path) -> List[dict]:
     doc = DocxDocument(str(path))
-    full_text = []
-    for para in doc.paragraphs:
-        full_text.append(para.text)
+    paragraphs = doc.paragraphs
+    breaks = [bool(para._element.xpath(_DOCX_PAGE_BREAK_XPATH)) for para in paragraphs]
+    has_breaks = any(breaks)
+
+    pages: List[List[str]] = [[]]
+    page_chars = 0
+    for para, page_break in zip(paragraphs, breaks):
+        new_page = page_break if has_breaks else page_chars >= DOCX_PAGE_CHARS
+        if new_page and pages[-1]:
+            pages.append([])
+            page_chars = 0
+        pages[-1].append(para.text)
+        page_chars += len(para.text) + 1
 
-    # Simple page-like chunking for Word
-    return [{"text": "\n".join(full_text), "metadata": {"page": 1}}]
+    return [
+        {"text": "\n".join(lines), "metadata": {"page": i + 1}}
+        for i, lines in enumerate(pages)
+    ]
 
 
 def _process_pptx(path: Path) -> List[dict]:
@@ -102,12 +185,46 @@ def _process_pptx(path: Path) -> List[dict]:
     return content_pages
 
 
+# Vision models downscale anything larger before looking at it (OpenAI fits
+# images into 2048x2048), so bigger uploads only inflate the request body.
+VISION_MAX_SIDE = 2048
+
+
+def _encode_image(path: Path) -> Tuple[str, str]:
+    """
+    (base64 payload, MIME type) of an image for a vision request. Oversized
+    images are downscaled first; others are encoded straight from a memory
+    map of the file instead of a copy read into Python (files smaller than a
+    page, including empty ones, are simply read).
+    """
+    try:
+        with Image.open(path) as img:
+            fmt = img.format if img.format in ("PNG", "WEBP") else "JPEG"
+            if max(img.size) > VISION_MAX_SIDE:
+                img.thumbnail((VISION_MAX_SIDE, VISION_MAX_SIDE))
+                if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+                    img = img.convert("RGB")
+                buffer = io.BytesIO()
+                img.save(buffer, format=fmt)
+                encoded = base64.b64encode(buffer.getbuffer()).decode("ascii")
+                return encoded, Image.MIME[fmt]
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not inspect image {path.name}, sending as is: {e}")
+
+    mime_type = mimetypes.guess_type(path.name)[0] or "image/jpeg"
+    with open(path, "rb") as f:
+        # mmap cannot map an empty file, and small ones aren't worth mapping
+        if path.stat().st_size < mmap.PAGESIZE:
+            return base64.b64encode(f.read()).decode("ascii"), mime_type
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return base64.b64encode(data).decode("ascii"), mime_type
+
+
 def _process_image(path: Path, db: Session, workspace_id: int) -> List[dict]:
     """
     Uses Vision LLM to describe the image.
     Supports both OpenAI Vision and Ollama Vision (llava/bakllava).
     """
-    import base64
     import requests
     from backend.services.settings import get_app_settings
 
@@ -122,8 +239,7 @@ def _process_image(path: Path, db: Session, workspace_id: int) -> List[dict]:
 
     prompt_text = "Describe this image in extreme detail for an educational RAG system. Extract all text, explain diagrams, and summarize key concepts shown."
 
-    with open(path, "rb") as image_file:
-        encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
+    encoded_string, mime_type = _encode_image(path)
 
     vision_provider = settings_db.vision_provider or "openai"
 
@@ -182,7 +298,7 @@ def _process_image(path: Path, db: Session, workspace_id: int) -> List[dict]:
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/jpeg;base64,{encoded_string}"
+                                "url": f"data:{mime_type};base64,{encoded_string}"
                             },
                         },
                     ],
@@ -207,57 +323,56 @@ def store_processed_content(db, db_doc, pages: List[dict]) -> int:
     db_doc.embedding_provider = provider
     db_doc.embedding_model = model_name
     db.commit()
-    all_rows: List[DocumentChunk] = []
+    all_rows: List[dict] = []
     chunk_index = 0
 
-    for page_data in pages:
-        page_text = page_data.get("text", "")
-        page_num = page_data.get("metadata", {}).get("page", 1)
-
-        refined = promote_structural_markers(page_text)
-        chunks = chunk_markdown(refined)
-
-        for _, batch in batch_iter(chunks, EMBED_BATCH_SIZE):
-            texts = [c.page_content for c in batch]
-            vectors = model.embed_documents(texts)
-
-            for i, (chunk, vector) in enumerate(zip(batch, vectors)):
-                meta = chunk.metadata.copy()
-                meta["page"] = page_num
-                meta["source"] = db_doc.title
-
-                # Context prefix logic from ingestion.py
-                headers = [
-                    str(meta.get(f"Header {j}"))
-                    for j in range(1, 7)
-                    if meta.get(f"Header {j}")
-                ]
-                prefix = f"Context: {' > '.join(headers) if headers else db_doc.title} (Page {page_num})"
-                enriched_content = f"{prefix}\n\n{chunk.page_content}"
-
-                chunk_args = {
-                    "document_id": db_doc.id,
-                    "workspace_id": db_doc.workspace_id,
-                    "content": enriched_content,
-                    "chunk_index": chunk_index,
-                    "chunk_metadata": meta,
-                }
+    # Columns shared by every row, read once: the per-window commits expire
+    # db_doc, so attribute access in the loop would reload it
+    base_row = {
+        "document_id": db_doc.id,
+        "workspace_id": db_doc.workspace_id,
+        "embedding_dim": dim,
+    }
+    title = db_doc.title
+
+    page_texts = (
+        (page_data.get("metadata", {}).get("page", 1), page_data.get("text", ""))
+        for page_data in pages
+    )
+
+    # Chunks under the same headers on the same page share one metadata dict
+    # and prefix; rows only reference it, it is serialized on insert.
+    groups: Dict[tuple, Tuple[dict, str]] = {}
+
+    for page_num, chunk, vector in embed_pages(
+        model, page_texts, cache_key=f"{provider}/{model_name}", db=db
+    ):
+        group_key = (tuple(chunk.metadata.items()), page_num)
+        group = groups.get(group_key)
+        if group is None:
+            meta = {**chunk.metadata, "page": page_num, "source": title}
+
+            prefix = format_context_prefix(header_values(meta), page_num, title)
+            group = groups[group_key] = (meta, prefix)
+        meta, prefix = group
+        enriched_content = f"{prefix}\n\n{chunk.page_content}"
+
+        chunk_args = {
+            **base_row,
+            "content": enriched_content,
+            "chunk_index": chunk_index,
+            "chunk_metadata": meta,
+            "embedding": vector,
+        }
+
+        all_rows.append(chunk_args)
+        chunk_index += 1
+
+        # Commit per window so large documents never sit in one transaction
+        if len(all_rows) >= INSERT_BATCH_SIZE:
+            flush_chunk_rows(db, db_doc, all_rows, page_progress(page_num, len(pages)))
 
-                # Assign to correct embedding column
-                if dim == 1536:
-                    chunk_args["embedding_1536"] = vector
-                elif dim == 1024:
-                    chunk_args["embedding_1024"] = vector
-                elif dim == 768:
-                    chunk_args["embedding_768"] = vector
-                elif dim == 384:
-                    chunk_args["embedding_384"] = vector
-                else:
-                    chunk_args["embedding_768"] = vector
-
-                all_rows.append(DocumentChunk(**chunk_args))
-                chunk_index += 1
-
-    db.add_all(all_rows)
+    insert_chunk_rows(db, all_rows)
+    db_doc.progress = 100
     db.commit()
     return chunk_index